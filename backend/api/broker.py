@@ -0,0 +1,250 @@
+"""Pub/sub used to push new notifications to connected clients.
+
+`NotificationStreamView` subscribes one asyncio queue per open connection;
+model signals and the bulk fan-out paths publish after their transaction
+commits. The broker class comes from the `NOTIFICATION_BROKER` setting:
+
+- `LocalBroker` only reaches connections served by the publishing process,
+  so it misses everything written by `run_fanout_worker` (and by the other
+  web processes). The stream refuses to run on it when fan-out is async.
+- `PostgresBroker` relays every publish through Postgres `LISTEN`/`NOTIFY`,
+  so any process (web or worker) reaches the listeners of every process.
+  It is the default when the database is Postgres.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    """Interface every broker implements."""
+    # True when publish() reaches listeners served by every process, fan-out workers' writes included
+    cross_process = False
+
+    def subscribe(self, user_id):
+        """Register a listener for `user_id` and return its `Subscription`."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, user_id, event):
+        """Deliver `event` (a JSON-serializable dict) to every listener of `user_id`.
+
+        Called from synchronous code in any thread; must not block.
+        """
+        raise NotImplementedError
+
+    def publish_request(self, request_id, user_ids):
+        """Deliver the fan-out notifications of `request_id` just written for `user_ids`.
+
+        Bulk inserts send no post_save signals. A user has at most one such
+        row per request, so the users identify exactly the new rows.
+        """
+        raise NotImplementedError
+
+    def listening_user_ids(self):
+        """Users with at least one listener, or None when the broker cannot tell.
+
+        Publishers use it to skip building events nobody will receive.
+        """
+        return None
+
+
+class Subscription:
+    """One listener: an asyncio queue bound to the event loop that created it."""
+    max_pending = 100
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+
+    def deliver(self, event):
+        # Drop events for a client that stopped reading; it resyncs from the list endpoint
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Next event, or None after `timeout` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker(Broker):
+    """In-process broker: reaches listeners of this worker process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            listeners = self._subscriptions.get(subscription.user_id)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        self._deliver(user_id, event)
+
+    def publish_request(self, request_id, user_ids):
+        self._deliver_request(request_id, user_ids)
+
+    def listening_user_ids(self):
+        return self._local_listeners()
+
+    # Delivery to this process's subscriptions ------------------------------
+
+    def _local_listeners(self):
+        with self._lock:
+            return set(self._subscriptions)
+
+    def _deliver(self, user_id, event):
+        with self._lock:
+            listeners = list(self._subscriptions.get(user_id, ()))
+        for subscription in listeners:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def _deliver_request(self, request_id, user_ids, batch_size=500):
+        # Only rows of users listening here are loaded
+        from core.models import Notification
+
+        users = sorted(set(user_ids) & self._local_listeners())
+        rows = Notification.objects.filter(request_id=request_id, kind=Notification.KIND_REQUEST)
+        for start in range(0, len(users), batch_size):
+            chunk = rows.filter(user_id__in=users[start:start + batch_size])
+            for notification in chunk.only('id', 'user_id', 'request_id', 'kind', 'message', 'read', 'created_at'):
+                self._deliver(notification.user_id, notification_event(notification))
+
+
+class PostgresBroker(LocalBroker):
+    """Cross-process broker over Postgres `LISTEN`/`NOTIFY`.
+
+    Publishing sends a `NOTIFY` through Django's connection (after the
+    publishing transaction committed). Each process that has stream clients
+    keeps one extra connection `LISTEN`ing in a daemon thread and delivers
+    what it receives to its own subscriptions, its own publishes included.
+    Messages sent while that connection reconnects are lost; clients catch
+    up through `Last-Event-ID` or the list endpoint.
+    """
+    cross_process = True
+    channel = 'notifications'
+    # NOTIFY payloads are capped at 8000 bytes
+    users_per_message = 500
+    reconnect_delay = 5
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='notification-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        self._notify({'user': user_id, 'event': event})
+
+    def publish_request(self, request_id, user_ids):
+        users = sorted(set(user_ids))
+        for start in range(0, len(users), self.users_per_message):
+            self._notify({'request': request_id, 'users': users[start:start + self.users_per_message]})
+
+    def listening_user_ids(self):
+        # Other processes' listeners are unknown here
+        return None
+
+    def _notify(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, json.dumps(message)])
+
+    def _dispatch(self, message):
+        if 'user' in message:
+            self._deliver(message['user'], message['event'])
+        elif set(message['users']) & self._local_listeners():
+            close_old_connections()
+            self._deliver_request(message['request'], message['users'])
+
+    def _listen(self):
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        while True:
+            try:
+                conn = psycopg2.connect(
+                    dbname=db['NAME'], user=db.get('USER') or None, password=db.get('PASSWORD') or None,
+                    host=db.get('HOST') or None, port=db.get('PORT') or None,
+                    sslmode=db.get('OPTIONS', {}).get('sslmode', 'prefer'),
+                )
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(json.loads(conn.notifies.pop(0).payload))
+            except Exception:
+                logger.exception("Notification listener lost its connection; reconnecting")
+                time.sleep(self.reconnect_delay)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return this process's broker (class from `NOTIFICATION_BROKER`)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'NOTIFICATION_BROKER', 'api.broker.LocalBroker'))()
+    return _broker
+
+
+def notification_event(notification):
+    """Event pushed for a new notification; clients fetch full rows from `notifications/`."""
+    return {
+        'id': notification.id,
+        'request': notification.request_id,
+        'kind': notification.kind,
+        'message': notification.message,
+        'read': notification.read,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def publish_notification(notification):
+    get_broker().publish(notification.user_id, notification_event(notification))
+
+
+def publish_request_notifications(request_id, user_ids):
+    """Publish the fan-out notifications of `request_id` just written for `user_ids`."""
+    get_broker().publish_request(request_id, user_ids)
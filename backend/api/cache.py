@@ -0,0 +1,62 @@
+"""Versioned cache for donor search results.
+
+Every cached search result is keyed by the normalized search terms plus a
+global "donor generation" counter. Any donor write bumps the counter (see
+`core.signals`), which makes every previously cached result unreachable at
+once; stale entries simply age out. This avoids having to enumerate or delete
+keys, and works the same on locmem, file-based and Redis caches.
+
+The counter is only global when the cache is shared by every worker (file or
+Redis). With the per-process locmem default a write bumps the writing
+worker's counter alone, so there cached pages are kept for at most
+`DONOR_SEARCH_LOCAL_CACHE_TIMEOUT` seconds to bound how long other workers
+can serve results that predate it.
+
+The backend comes from Django's `CACHES` setting (see settings.py).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+DONOR_GENERATION_KEY = 'donors:generation'
+
+
+def donor_generation():
+    """Return the current donor generation, initialising it if missing."""
+    generation = cache.get(DONOR_GENERATION_KEY)
+    if generation is None:
+        cache.add(DONOR_GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(DONOR_GENERATION_KEY, 1)
+    return generation
+
+
+def bump_donor_generation():
+    """Invalidate all cached donor results by moving to a new generation."""
+    try:
+        return cache.incr(DONOR_GENERATION_KEY)
+    except ValueError:
+        # Counter missing (evicted or never read): start a generation that no
+        # cached entry can have been written under.
+        cache.set(DONOR_GENERATION_KEY, 2, timeout=None)
+        return 2
+
+
+def donor_cache_key(namespace, *parts):
+    """Build a cache key for donor-derived data under the current generation."""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return f'donors:{namespace}:{donor_generation()}:{digest}'
+
+
+def generation_is_shared():
+    """True when every worker process reads the same donor generation counter."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def donor_cache_timeout():
+    timeout = getattr(settings, 'DONOR_SEARCH_CACHE_TIMEOUT', 300)
+    if not generation_is_shared():
+        timeout = min(timeout, getattr(settings, 'DONOR_SEARCH_LOCAL_CACHE_TIMEOUT', 10))
+    return timeout
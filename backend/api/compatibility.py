@@ -0,0 +1,45 @@
+"""Red-cell blood group compatibility, precomputed as bitmasks.
+
+Each of the eight groups gets one bit. `DONOR_MASKS[recipient]` has the bits of
+every group that can give to that recipient; they are folded once into
+`COMPATIBLE_DONORS`, so expanding a recipient to its donor groups is a table
+lookup.
+"""
+
+# Canonical group order (also used for analytics output)
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-')
+
+GROUP_BITS = {group: 1 << i for i, group in enumerate(BLOOD_GROUPS)}
+
+
+def _antigens(group):
+    abo, rh = group[:-1], group[-1]
+    antigens = set(abo) - {'O'}
+    if rh == '+':
+        antigens.add('D')
+    return antigens
+
+
+def _can_give(donor, recipient):
+    # A donor's red cells must not carry an antigen the recipient lacks
+    return _antigens(donor) <= _antigens(recipient)
+
+
+DONOR_MASKS = {
+    recipient: sum(GROUP_BITS[donor] for donor in BLOOD_GROUPS if _can_give(donor, recipient))
+    for recipient in BLOOD_GROUPS
+}
+
+# Donor groups per recipient, exact match first, then in canonical order
+COMPATIBLE_DONORS = {
+    recipient: (recipient,) + tuple(
+        donor for donor in BLOOD_GROUPS
+        if donor != recipient and DONOR_MASKS[recipient] & GROUP_BITS[donor]
+    )
+    for recipient in BLOOD_GROUPS
+}
+
+
+def compatible_donor_groups(recipient_group):
+    """Canonical donor groups able to give to `recipient_group` (exact first); () if unknown."""
+    return COMPATIBLE_DONORS.get(recipient_group, ())
@@ -0,0 +1,74 @@
+"""Conditional GET support (ETag) for donor list endpoints.
+
+Polling clients usually re-fetch an unchanged list. The ETag of a donor list
+is derived from two values that cost nothing to read:
+
+- the donor version (`core.models.DonorVersion`), bumped in the same
+  transaction as every profile write, and
+- the availability cutoff date, which moves once a day.
+
+So answering `If-None-Match` with 304 is one primary-key read, whatever the
+size of the filter set. The version is global rather than per filter set: a
+write anywhere changes every donor list's ETag, like the donor generation
+does for cached pages.
+
+A 200 must carry a body that matches its ETag, or the client's next poll
+would pin it to stale rows. Views keep the watermark on `self.watermark` and
+only answer from a worker-local source (cached page, donor index) built at
+the same version; see `source_is_current`.
+
+No `Last-Modified` is sent: the ETag already covers every change, including
+deletions and the daily cutoff change.
+"""
+import hashlib
+
+from django.db.models import F
+from django.utils.cache import get_conditional_response, quote_etag
+
+from core.models import DonorVersion
+
+DONOR_VERSION_PK = 1
+
+
+def donor_version():
+    """Current donor version (0 before the first donor write)."""
+    return DonorVersion.objects.filter(pk=DONOR_VERSION_PK).values_list('version', flat=True).first() or 0
+
+
+def bump_donor_version():
+    """Move the donor version; call inside the transaction of the write it covers."""
+    if not DonorVersion.objects.filter(pk=DONOR_VERSION_PK).update(version=F('version') + 1):
+        DonorVersion.objects.get_or_create(pk=DONOR_VERSION_PK, defaults={'version': 1})
+
+
+class ConditionalListMixin:
+    """Short-circuit GET with 304 when neither the donor version nor the cutoff moved."""
+
+    def get_watermark(self):
+        from api.donors import donor_cutoff
+
+        return {'version': donor_version(), 'cutoff': donor_cutoff()}
+
+    def get_etag(self, request, mark):
+        parts = (type(self).__name__, request.get_full_path(), mark['version'], mark['cutoff'].isoformat())
+        return quote_etag(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest())
+
+    def source_is_current(self, version):
+        """True when a local source built at donor `version` matches this response's ETag."""
+        if version is None:
+            return False
+        watermark = getattr(self, 'watermark', None)
+        if watermark is None:
+            return True
+        return version == watermark['version']
+
+    def get(self, request, *args, **kwargs):
+        self.watermark = mark = self.get_watermark()
+        self.etag = etag = self.get_etag(request, mark)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
@@ -0,0 +1,119 @@
+"""District autocomplete backed by a compact, sorted in-memory structure.
+
+`UserProfile.district` is free text. Instead of running `DISTINCT` over the
+profile table on every keystroke, each worker keeps a sorted array of distinct
+district keys with a display name and the number of available donors, and
+answers prefix lookups with a bisect (plus a fuzzy fallback for typos).
+
+The structure is rebuilt with one grouped query whenever the donor generation
+(bumped on every profile write, see `api.cache`) or the availability cutoff
+changes. The generation only follows other workers' writes on a shared cache;
+with the per-process default the structure is also rebuilt once it is older
+than `donor_cache_timeout()`, the same bound cached search pages get.
+
+Rebuilds run in a background thread and swap the arrays in when done, so
+lookups keep answering from the previous ones meanwhile. Before the first
+build is ready a lookup runs the grouped query for its prefix alone (without
+the fuzzy fallback).
+"""
+import difflib
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connection
+from django.db.models import Count, Min, Q
+
+from core.models import UserProfile, normalize_district
+
+logger = logging.getLogger(__name__)
+
+
+class DistrictSuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0
+        self._rebuilding = False
+        # (keys, names, counts), swapped as one so readers never mix two builds
+        self._arrays = None
+
+    def _districts(self, cutoff):
+        available = Q(last_donation__isnull=True) | Q(last_donation__lt=cutoff)
+        return (
+            UserProfile.objects.exclude(district_key__isnull=True).exclude(district_key='')
+            .values('district_key')
+            .annotate(name=Min('district'), donors=Count('id', filter=available))
+            .order_by('district_key')
+        )
+
+    def _build(self, cutoff):
+        keys, names, counts = [], [], []
+        for row in self._districts(cutoff):
+            keys.append(row['district_key'])
+            names.append(row['name'])
+            counts.append(row['donors'])
+        return keys, names, counts
+
+    def _rebuild_in_background(self, version, cutoff):
+        try:
+            arrays = self._build(cutoff)
+            with self._lock:
+                self._arrays = arrays
+                self._version = version
+                self._built_at = time.monotonic()
+        except Exception:
+            logger.exception("District suggest rebuild failed; serving the previous arrays")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            connection.close()
+
+    def _ensure_fresh(self):
+        """Schedule a rebuild when stale and return the arrays to answer from (None before the first)."""
+        from api.cache import donor_cache_timeout, donor_generation, generation_is_shared
+        from api.donors import donor_cutoff
+
+        cutoff = donor_cutoff()
+        version = (donor_generation(), cutoff)
+        with self._lock:
+            expired = not generation_is_shared() and time.monotonic() - self._built_at > donor_cache_timeout()
+            if (version != self._version or expired) and not self._rebuilding:
+                self._rebuilding = True
+                threading.Thread(
+                    target=self._rebuild_in_background, args=(version, cutoff),
+                    name='district-suggest-rebuild', daemon=True,
+                ).start()
+            return self._arrays
+
+    def suggest(self, query, limit=10):
+        """Districts whose key starts with `query`, then close spellings if room is left."""
+        key = normalize_district(query)
+        if not key:
+            return []
+        arrays = self._ensure_fresh()
+        if arrays is None:
+            from api.donors import donor_cutoff
+
+            rows = self._districts(donor_cutoff()).filter(district_key__startswith=key)[:limit]
+            return [{'district': row['name'], 'donors': row['donors']} for row in rows]
+        keys, names, counts = arrays
+        picked = []
+        pos = bisect_left(keys, key)
+        while pos < len(keys) and len(picked) < limit and keys[pos].startswith(key):
+            picked.append(pos)
+            pos += 1
+        if len(picked) < limit:
+            seen = set(picked)
+            for match in difflib.get_close_matches(key, keys, n=limit, cutoff=0.6):
+                i = bisect_left(keys, match)
+                if i not in seen:
+                    picked.append(i)
+                    seen.add(i)
+                if len(picked) >= limit:
+                    break
+        return [{'district': names[i], 'donors': counts[i]} for i in picked]
+
+
+district_index = DistrictSuggestIndex()
@@ -0,0 +1,406 @@
+"""In-process donor availability index.
+
+Public search, inventory, analytics and request fan-out all ask the same
+question: which donors are outside the rest window, grouped by blood group and
+district. This module keeps the answer in memory inside each worker so those
+hot paths do not have to re-query `UserProfile`.
+
+Layout: one bucket per (blood_group, district_key), each sorted by
+(last_donation NULLs first, id). Because availability only depends on
+`last_donation < cutoff`, the available donors of a bucket are always a prefix
+of it and can be found with a single bisect.
+
+Freshness:
+- `core.signals` forwards UserProfile/User saves and deletes (after commit) so
+  the worker that made a change sees it immediately.
+- The index rebuilds itself when the date (and so the cutoff) rolls over, and
+  after `DONOR_INDEX_MAX_AGE` seconds so changes made by other workers are
+  picked up within a bounded delay. Every build, the first one included, loads
+  the new snapshot in a background thread and swaps it in; requests keep
+  reading the old one, or the database until the first one is ready.
+- Rows are never read from the database while the index lock is held, so
+  readers only ever wait for in-memory work.
+- `version()` is the donor version (`api.conditional`) the index reflects:
+  the one read before its snapshot was loaded, plus one for each of this
+  worker's writes applied since (every bump is paired with one refresh). When
+  it differs from the database's, another worker has written and callers
+  answer from the database until the next rebuild.
+
+Disable with `DONOR_INDEX_ENABLED=False`; callers then fall back to the DB.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date
+
+from django.conf import settings
+from django.db import connection
+
+from core.models import UserProfile
+from api.conditional import donor_version
+
+logger = logging.getLogger(__name__)
+
+
+DonorEntry = namedtuple('DonorEntry', [
+    'id', 'user_id', 'blood_group', 'district', 'district_key', 'last_donation',
+    'username', 'full_name', 'email', 'phone', 'updated_at',
+])
+
+_LOAD_COLUMNS = (
+    'id', 'user_id', 'blood_group', 'district', 'district_key', 'last_donation',
+    'user__username', 'user__first_name', 'user__last_name', 'user__email',
+    'phone', 'share_phone', 'updated_at',
+)
+
+
+def sort_key(last_donation, pk):
+    """Ordering key shared with `DonorCursorPagination`: NULL dates first, then date, then id."""
+    return (last_donation is not None, last_donation or date.min, pk)
+
+
+def _fetch(profile_ids):
+    """Current entries of `profile_ids` as {id: entry}; deleted profiles are absent."""
+    rows = UserProfile.objects.filter(pk__in=list(profile_ids)).values_list(*_LOAD_COLUMNS)
+    return {row[0]: _entry_from_row(row) for row in rows}
+
+
+def _apply(buckets, by_id, profile_id, entry):
+    """Replace profile `profile_id` in a snapshot with `entry` (None drops it)."""
+    old = by_id.pop(profile_id, None)
+    if old is not None:
+        bucket = buckets.get((old.blood_group, old.district_key))
+        if bucket is not None:
+            bucket.discard(old)
+    if entry is not None:
+        by_id[entry.id] = entry
+        bucket = buckets.get((entry.blood_group, entry.district_key))
+        if bucket is None:
+            bucket = buckets[(entry.blood_group, entry.district_key)] = _Bucket()
+        bucket.add(entry)
+
+
+def _entry_from_row(row):
+    (pk, user_id, blood_group, district, district_key, last_donation,
+     username, first_name, last_name, email, phone, share_phone, updated_at) = row
+    full_name = f"{first_name or ''} {last_name or ''}".strip() or username
+    return DonorEntry(
+        pk, user_id, blood_group, district, district_key, last_donation,
+        username, full_name, email, phone if share_phone else None, updated_at,
+    )
+
+
+class _Bucket:
+    """Entries of one (blood_group, district_key) pair plus their sort keys."""
+    __slots__ = ('keys', 'entries')
+
+    def __init__(self):
+        self.keys = []
+        self.entries = []
+
+    def add(self, entry):
+        key = sort_key(entry.last_donation, entry.id)
+        pos = bisect_left(self.keys, key)
+        self.keys.insert(pos, key)
+        self.entries.insert(pos, entry)
+
+    def discard(self, entry):
+        key = sort_key(entry.last_donation, entry.id)
+        pos = bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            del self.keys[pos]
+            del self.entries[pos]
+
+    def window(self, cutoff, after=None, before=None):
+        """Index range of available entries, optionally strictly after/before a sort key."""
+        stop = bisect_left(self.keys, (True, cutoff, 0))
+        start = 0
+        if after is not None:
+            start = bisect_right(self.keys, after, 0, stop)
+        if before is not None:
+            stop = bisect_left(self.keys, before, 0, stop)
+        return start, stop
+
+
+class DonorAvailabilityIndex:
+    def __init__(self, max_age=None):
+        self._lock = threading.RLock()
+        # Held only while loading a snapshot, never by readers
+        self._build_lock = threading.Lock()
+        self._buckets = {}
+        self._by_id = {}
+        self._built_on = None
+        self._built_at = 0.0
+        self._version = None
+        self._rebuilding = False
+        # Profile ids written while a snapshot loads (one per write); replayed onto it before the swap
+        self._pending = None
+        # Bumped by every swap and by every change to one profile, so a row read
+        # without the lock is only applied if nothing overtook it meanwhile
+        self._snapshot = 0
+        self._changes = {}
+        self.max_age = max_age
+        self._stats = {'hits': 0, 'misses': 0, 'rebuilds': 0, 'updates': 0, 'removals': 0}
+
+    # Maintenance -----------------------------------------------------------
+
+    def rebuild(self):
+        """Load a new snapshot without holding the index lock, then swap it in.
+
+        Readers keep using the previous snapshot meanwhile. Writes signalled
+        during the load are re-read onto the new snapshot before the swap, so
+        none is lost whichever side of the load they fell on.
+        """
+        with self._build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._pending = []
+        try:
+            # Read before the rows: a write landing in between makes the version look older, never newer
+            version = donor_version()
+            buckets, by_id = self._load()
+            replayed = 0
+            while True:
+                with self._lock:
+                    pending = self._pending[replayed:]
+                    if not pending:
+                        self._buckets = buckets
+                        self._by_id = by_id
+                        self._built_on = date.today()
+                        self._built_at = time.monotonic()
+                        self._version = version + replayed
+                        self._pending = None
+                        self._snapshot += 1
+                        self._changes = {}
+                        self._stats['rebuilds'] += 1
+                        return
+                # Not shared yet: patched without the lock
+                entries = _fetch(set(pending))
+                for profile_id in set(pending):
+                    _apply(buckets, by_id, profile_id, entries.get(profile_id))
+                replayed += len(pending)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+    def _load(self):
+        buckets = {}
+        by_id = {}
+        rows = UserProfile.objects.values_list(*_LOAD_COLUMNS)
+        for row in rows.iterator(chunk_size=5000):
+            entry = _entry_from_row(row)
+            by_id[entry.id] = entry
+            bucket = buckets.get((entry.blood_group, entry.district_key))
+            if bucket is None:
+                bucket = buckets[(entry.blood_group, entry.district_key)] = _Bucket()
+            bucket.keys.append(sort_key(entry.last_donation, entry.id))
+            bucket.entries.append(entry)
+        for bucket in buckets.values():
+            pairs = sorted(zip(bucket.keys, bucket.entries), key=lambda pair: pair[0])
+            bucket.keys = [k for k, _ in pairs]
+            bucket.entries = [e for _, e in pairs]
+        return buckets, by_id
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Donor index rebuild failed; serving the previous snapshot")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            connection.close()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_on = None
+
+    def ensure_fresh(self):
+        """Schedule a rebuild when there is no snapshot or it is stale; True when one can answer.
+
+        Builds always run in a background thread. Until the first one (or the
+        first after `invalidate()`) finishes this returns False and callers
+        read the database. A snapshot from an earlier day or older than
+        `max_age` keeps answering meanwhile: the cutoff is applied at query
+        time, and this worker's own writes are already in it.
+        """
+        with self._lock:
+            ready = self._built_on is not None
+            stale = not ready or self._built_on != date.today() or (
+                self.max_age is not None and time.monotonic() - self._built_at > self.max_age
+            )
+            if stale and not self._rebuilding:
+                self._rebuilding = True
+                threading.Thread(target=self._rebuild_in_background, name='donor-index-rebuild', daemon=True).start()
+            self._stats['hits' if ready else 'misses'] += 1
+        return ready
+
+    def refresh_profile(self, profile_id):
+        """Reload one profile from the DB (called after a save, and its version bump, commits)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(profile_id)
+            if self._built_on is None:
+                return
+            snapshot = self._snapshot
+        while True:
+            with self._lock:
+                seen = self._changes.get(profile_id, 0)
+            entry = _fetch([profile_id]).get(profile_id)
+            with self._lock:
+                if self._built_on is None or self._snapshot != snapshot:
+                    # Invalidated, or swapped for a snapshot that already has this write
+                    return
+                if self._changes.get(profile_id, 0) != seen:
+                    # Another write to this profile landed while reading: its row may be newer
+                    continue
+                self._changes[profile_id] = seen + 1
+                _apply(self._buckets, self._by_id, profile_id, entry)
+                self._version += 1
+                self._stats['updates'] += 1
+                return
+
+    def refresh_user(self, user_id):
+        with self._lock:
+            if self._built_on is None:
+                return
+        profile_id = UserProfile.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+        if profile_id is not None:
+            self.refresh_profile(profile_id)
+
+    def remove_profile(self, profile_id):
+        with self._lock:
+            if self._pending is not None:
+                # The loading snapshot may still contain it; the replay drops it
+                self._pending.append(profile_id)
+            if self._built_on is None:
+                return
+            self._changes[profile_id] = self._changes.get(profile_id, 0) + 1
+            _apply(self._buckets, self._by_id, profile_id, None)
+            self._version += 1
+            self._stats['removals'] += 1
+
+    # Queries ---------------------------------------------------------------
+
+    def _matching_buckets(self, blood_group, district_key):
+        """Buckets for one blood group, a collection of groups, or any (None)."""
+        if isinstance(blood_group, str) and district_key is not None:
+            bucket = self._buckets.get((blood_group, district_key))
+            return [bucket] if bucket is not None else []
+        if isinstance(blood_group, str):
+            blood_group = (blood_group,)
+        return [
+            bucket for (bg, dk), bucket in self._buckets.items()
+            if (blood_group is None or bg in blood_group) and (district_key is None or dk == district_key)
+        ]
+
+    def available(self, blood_group=None, district_key=None, cutoff=None,
+                  after=None, before=None, limit=None):
+        """Available donors in (last_donation NULLs first, id) order.
+
+        `after`/`before` are `(last_donation, id)` keys for keyset paging;
+        with `before` the rows come back nearest-first (descending). Only
+        meaningful once `ensure_fresh()` returned True.
+        """
+        from api.donors import donor_cutoff
+
+        cutoff = cutoff or donor_cutoff()
+        after_key = sort_key(*after) if after is not None else None
+        before_key = sort_key(*before) if before is not None else None
+        with self._lock:
+            runs = []
+            for bucket in self._matching_buckets(blood_group, district_key):
+                start, stop = bucket.window(cutoff, after_key, before_key)
+                if start >= stop:
+                    continue
+                if before_key is not None:
+                    runs.append(bucket.entries[max(start, stop - limit if limit else start):stop][::-1])
+                else:
+                    runs.append(bucket.entries[start:stop if not limit else min(stop, start + limit)])
+            key = lambda e: sort_key(e.last_donation, e.id)
+            merged = heapq.merge(*runs, key=key, reverse=before_key is not None)
+            return [e for _, e in zip(range(limit), merged)] if limit else list(merged)
+
+    def version(self):
+        """The donor version this snapshot reflects (compare with `api.conditional.donor_version`).
+
+        Equal to the database's when no other worker has written since the
+        snapshot, so a body built from the index matches the ETag it is sent
+        with. Callers fall back to the database when it differs, or when
+        this is None because the first snapshot is still loading.
+        """
+        if not self.ensure_fresh():
+            return None
+        with self._lock:
+            return self._version
+
+    def counts_by_blood_group(self, cutoff=None):
+        from api.donors import donor_cutoff
+
+        cutoff = cutoff or donor_cutoff()
+        counts = {}
+        with self._lock:
+            for (bg, _), bucket in self._buckets.items():
+                start, stop = bucket.window(cutoff)
+                if stop > start:
+                    counts[bg] = counts.get(bg, 0) + stop - start
+        return counts
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['profiles'] = len(self._by_id)
+            data['buckets'] = len(self._buckets)
+            data['built_on'] = self._built_on
+            data['version'] = self._version
+            data['age_seconds'] = round(time.monotonic() - self._built_at, 1) if self._built_on else None
+        return data
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_donor_index():
+    """Return this worker's index, or None when disabled in settings."""
+    global _index
+    if not getattr(settings, 'DONOR_INDEX_ENABLED', True):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DonorAvailabilityIndex(max_age=getattr(settings, 'DONOR_INDEX_MAX_AGE', 300))
+    return _index
+
+
+def donor_public_data(entry):
+    """Render an index entry exactly like `PublicDonorProfileSerializer`."""
+    return {
+        'username': entry.username,
+        'full_name': entry.full_name,
+        'email': entry.email,
+        'blood_group': entry.blood_group,
+        'district': entry.district,
+        'last_donation': entry.last_donation.isoformat() if entry.last_donation else None,
+        'phone': entry.phone,
+    }
+
+
+def donor_inventory_data(entry):
+    """Render an index entry like the dicts built by `BloodInventoryList.list`."""
+    return {
+        'id': entry.id,
+        'username': entry.username,
+        'full_name': entry.full_name,
+        'email': entry.email,
+        'phone': entry.phone,
+        'blood_group': entry.blood_group,
+        'district': entry.district,
+        'last_donation': entry.last_donation,
+    }
@@ -8,15 +8,19 @@ Keep logic unchanged; only imports adjusted for the new location.
 Note: this file is intended to be the single source-of-truth for donors-related API.
 """
 from rest_framework import generics, status, permissions
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 
 # Import models/serializers from the consolidated core app
-from core.models import Request, BloodInventory, Donation, UserProfile, Notification
+from core.models import (
+    Request, BloodInventory, Donation, UserProfile, Notification,
+    normalize_blood_group, normalize_district,
+)
 from api.serializers_donors import (
     RequestSerializer,
     BloodInventorySerializer,
@@ -25,9 +29,22 @@ from api.serializers_donors import (
     PublicDonorProfileSerializer,
     NotificationSerializer,
 )
-
-from django.db.models import Count, Sum
-from django.db import models
+from api.pagination import DonorCursorPagination, CompatibleDonorCursorPagination, NearbyDonorCursorPagination
+from api.compatibility import BLOOD_GROUPS, compatible_donor_groups
+from api.donor_index import get_donor_index, donor_public_data, donor_inventory_data
+from api.cache import donor_cache_key, donor_cache_timeout, bump_donor_generation
+from api.districts import district_index
+from api.conditional import ConditionalListMixin, bump_donor_version
+from api.sparse import requested_fields, only_columns, pick_fields, FIELDS_QUERY_PARAM
+from api.geo import find_district, districts_within
+from api.notifications import unread_count, request_left_unread, mark_read, refresh_payloads
+from api.fanout import notify_matching_donors, enqueue_fanout, fanout_async, fanout_waves, start_waves, cancel_fanout
+from api.projections import PUBLIC_DONOR_PROJECTION, INVENTORY_PROJECTION
+from django.core.cache import cache
+
+from django.db.models import Count, Sum, Min, Case, When, Value, IntegerField
+from django.db import models, transaction
+from django.utils import timezone
 from datetime import date, timedelta
 import logging
 
@@ -36,26 +53,321 @@ logger = logging.getLogger(__name__)
 # BUSINESS CONSTANTS (single place to change donor rest window)
 DONOR_REST_WINDOW_DAYS = 90
 
+# Ranked donor search (?top=K) score weights: a donor in the searched district
+# always outranks one outside it, an exact group match outranks a merely
+# compatible one, and longer rest (in 30-day steps, capped) breaks the rest.
+RANK_DISTRICT_WEIGHT = 100
+RANK_EXACT_GROUP_WEIGHT = 20
+RANK_REST_MONTHS_CAP = 12
+RANKED_SEARCH_MAX = 100
+
+# Proximity search (?near=<district>&radius_km=)
+NEAR_DEFAULT_RADIUS_KM = 50
+NEAR_MAX_RADIUS_KM = 500
+
+
+def donor_cutoff(today=None):
+    """Return the date before which a last donation no longer blocks a donor."""
+    return (today or date.today()) - timedelta(days=DONOR_REST_WINDOW_DAYS)
+
+
+def available_profiles(cutoff=None):
+    """UserProfile queryset limited to donors outside the rest window.
+
+    Availability is derived from `last_donation` only: donors who never
+    donated or donated before the cutoff are available.
+    """
+    cutoff = cutoff or donor_cutoff()
+    return UserProfile.objects.filter(models.Q(last_donation__isnull=True) | models.Q(last_donation__lt=cutoff))
+
 
 # Public donor search (by blood group, no auth required)
 # TASK: Exposed at GET /api/donors/search/ (frontend public donor search)
-class PublicDonorSearch(generics.ListAPIView):
+# Results are keyset-paginated on (last_donation, id): ?cursor=<next/previous>&page_size=<=100
+# ?recipient_group=<group> instead returns every donor who can give to that group, exact match first.
+# ?top=K returns only the K best donors by a SQL-side score (district is then a preference, not a filter).
+# ?near=<district>&radius_km=<km> searches every gazetteer district within the radius instead of one
+# district, nearest first, and adds distance_km (between district centres) to each row.
+# Supports If-None-Match (304 without running the search).
+class PublicDonorSearch(ConditionalListMixin, generics.ListAPIView):
     serializer_class = PublicDonorProfileSerializer
     permission_classes = [AllowAny]
+    pagination_class = DonorCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.near():
+                self._paginator = NearbyDonorCursorPagination()
+            elif self.recipient_group():
+                self._paginator = CompatibleDonorCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def recipient_group(self):
+        value = normalize_blood_group(self.request.query_params.get('recipient_group'))
+        if not value:
+            return None
+        if not compatible_donor_groups(value):
+            raise ValidationError({'recipient_group': 'Unknown blood group.'})
+        return value
+
+    def near(self):
+        """[(district_key, distance_km)] within ?radius_km of ?near, nearest first; None without ?near."""
+        if not hasattr(self, '_near'):
+            params = self.request.query_params
+            self._near = None
+            if params.get('near'):
+                origin = find_district(params['near'])
+                if origin is None:
+                    raise ValidationError({'near': 'Unknown district.'})
+                try:
+                    radius = float(params.get('radius_km', NEAR_DEFAULT_RADIUS_KM))
+                except ValueError:
+                    raise ValidationError({'radius_km': 'Must be a number.'})
+                if not 0 <= radius <= NEAR_MAX_RADIUS_KM:
+                    raise ValidationError({'radius_km': f'Must be between 0 and {NEAR_MAX_RADIUS_KM}.'})
+                self._near = districts_within(origin, radius)
+        return self._near
+
+    def response_fields(self):
+        available = list(self.serializer_class.sparse_field_sources)
+        if self.near() and not self.top_k():
+            available.append('distance_km')
+        return requested_fields(self.request, available)
+
+    def search_terms(self):
+        # Values are stored canonically (see core.models.normalize_*), so plain
+        # equality lets `donor_search_idx` serve the lookup instead of a table scan.
+        params = self.request.query_params
+        return (
+            normalize_blood_group(params.get('blood_group')) or None,
+            normalize_district(params.get('district')) or None,
+        )
+
+    def filter_candidates(self, qs):
+        """Apply the search filters other than availability."""
+        blood_group, district = self.search_terms()
+        recipient = self.recipient_group()
+        near = self.near()
+        if near is not None:
+            # Proximity replaces the single-district filter
+            qs = qs.filter(district_key__in=[key for key, _ in near])
+            district = None
+        if self.top_k():
+            # Ranked mode: district only contributes to the score
+            target = recipient or blood_group
+            if target:
+                qs = qs.filter(blood_group__in=compatible_donor_groups(target) or [target])
+            return qs
+        if recipient:
+            # One IN query over every compatible group
+            qs = qs.filter(blood_group__in=compatible_donor_groups(recipient))
+        elif blood_group:
+            qs = qs.filter(blood_group=blood_group)
+        if district:
+            qs = qs.filter(district_key=district)
+        return qs
 
     def get_queryset(self):
         # TASK: filter available donors by blood_group and district
-        blood_group = self.request.query_params.get('blood_group')
-        district = self.request.query_params.get('district')
-        cutoff = date.today() - timedelta(days=DONOR_REST_WINDOW_DAYS)
-        qs = UserProfile.objects.select_related('user').all()
-        if blood_group:
-            qs = qs.filter(blood_group__iexact=blood_group)
+        qs = self.filter_candidates(available_profiles().select_related('user'))
+        sources = self.serializer_class.sparse_field_sources
+        fields = self.response_fields()
+        return only_columns(qs, sources, fields and [f for f in fields if f in sources], always=('id', 'last_donation'))
+
+    def rank_partitions(self, qs):
+        """Split `qs` for the ranked modes: [(rank, [queryset, ...])], or None in plain mode.
+
+        Each partition is one blood group and/or one district tagged with its
+        rank, so an index returns it in (last_donation, id) order and
+        `RankedKeysetPagination` can merge pages from bounded seeks instead
+        of sorting every match by a computed rank.
+        """
+        near = self.near()
+        recipient = self.recipient_group()
+        rank = lambda value: Value(value, output_field=IntegerField())
+        if near is not None:
+            blood_group, _ = self.search_terms()
+            groups = compatible_donor_groups(recipient) if recipient else [blood_group]
+            # Districts at the same distance (a name and its aliases) share a rank
+            ranks = {distance: i for i, distance in enumerate(sorted({d for _, d in near}))}
+            partitions = {}
+            for key, distance in near:
+                district_qs = qs.filter(district_key=key).annotate(distance_rank=rank(ranks[distance]))
+                partitions.setdefault(ranks[distance], []).extend(
+                    district_qs.filter(blood_group=group) if group else district_qs for group in groups
+                )
+            return sorted(partitions.items())
+        if recipient:
+            # Exact group ranks first
+            exact, *others = compatible_donor_groups(recipient)
+            return [
+                (0, [qs.filter(blood_group=exact).annotate(match_rank=rank(0))]),
+                (1, [qs.filter(blood_group=group).annotate(match_rank=rank(1)) for group in others]),
+            ]
+        return None
+
+    def top_k(self):
+        value = self.request.query_params.get('top')
+        if not value:
+            return None
+        try:
+            top = int(value)
+        except ValueError:
+            raise ValidationError({'top': 'Must be an integer.'})
+        return max(1, min(top, RANKED_SEARCH_MAX))
+
+    def ranked_queryset(self, top):
+        """Top-K available donors ordered by a score computed in one annotated query."""
+        blood_group, district = self.search_terms()
+        target = self.recipient_group() or blood_group
+        qs = self.filter_candidates(available_profiles().select_related('user'))
+        qs = self.serializer_class.only_for_request(qs, self.request, always=('id', 'last_donation'))
+        if target:
+            exact = Case(When(blood_group=target, then=Value(1)), default=Value(0), output_field=IntegerField())
+        else:
+            exact = Value(0, output_field=IntegerField())
         if district:
-            qs = qs.filter(district__iexact=district)
-        # Availability: include profiles with no last_donation or last_donation older than cutoff
-        qs = qs.filter(models.Q(last_donation__isnull=True) | models.Q(last_donation__lt=cutoff))
-        return qs
+            in_district = Case(When(district_key=district, then=Value(1)), default=Value(0), output_field=IntegerField())
+        else:
+            in_district = Value(0, output_field=IntegerField())
+        today = date.today()
+        rest_months = Case(
+            When(last_donation__isnull=True, then=Value(RANK_REST_MONTHS_CAP)),
+            *[
+                When(last_donation__lte=today - timedelta(days=30 * months), then=Value(months))
+                for months in range(RANK_REST_MONTHS_CAP, 0, -1)
+            ],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        qs = qs.annotate(
+            score=in_district * RANK_DISTRICT_WEIGHT + exact * RANK_EXACT_GROUP_WEIGHT + rest_months,
+        )
+        return qs.order_by('-score', models.F('last_donation').asc(nulls_first=True), 'id')[:top]
+
+    def list(self, request, *args, **kwargs):
+        # Cached per normalized (blood_group, district, page) under the donor
+        # generation, so any donor write invalidates every cached page at once.
+        # The ETag (donor version + cutoff) is part of the key, so a cached
+        # page is only served with the ETag it was built under.
+        blood_group, district = self.search_terms()
+        params = request.query_params
+        key = donor_cache_key(
+            'search', request.get_host(), blood_group, self.recipient_group(), district, donor_cutoff(),
+            params.get(self.paginator.cursor_query_param), self.paginator.get_page_size(request), self.top_k(),
+            params.get(FIELDS_QUERY_PARAM), tuple(self.near() or ()), getattr(self, 'etag', None),
+        )
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = self.search(request, *args, **kwargs)
+        data = dict(response.data, results=list(response.data['results']))
+        cache.set(key, data, donor_cache_timeout())
+        return response
+
+    def search(self, request, *args, **kwargs):
+        fields = self.response_fields()
+        top = self.top_k()
+        if top:
+            paths, formatter = PUBLIC_DONOR_PROJECTION.compile(fields)
+            rows = self.ranked_queryset(top).values_list(*paths)
+            return Response({'results': [formatter(row) for row in rows]})
+        index = get_donor_index()
+        if index is None or self.recipient_group() or self.near() is not None:
+            return self.search_database(request, fields)
+        blood_group, district = self.search_terms()
+        if not self.source_is_current(index.version()):
+            # The index has not caught up with another worker's write yet
+            return self.search_database(request, fields)
+        # Answer from the in-process availability index with the same keyset paging
+
+        def fetch(key, reverse, limit):
+            if reverse:
+                return index.available(blood_group, district, before=key, limit=limit)
+            return index.available(blood_group, district, after=key, limit=limit)
+
+        page = self.paginator.paginate_source(fetch, request)
+        return self.paginator.get_paginated_response([pick_fields(donor_public_data(e), fields) for e in page])
+
+    def search_database(self, request, fields):
+        """Keyset page straight from values_list() tuples (same output as the serializer)."""
+        paginator = self.paginator
+        near = self.near()
+        extra_paths = paginator.ordering + (('district_key',) if near is not None else ())
+        columns = fields and [f for f in fields if f != 'distance_km']
+        paths, formatter = PUBLIC_DONOR_PROJECTION.compile(columns, extra_paths=extra_paths)
+        queryset = self.get_queryset()
+        partitions = self.rank_partitions(queryset)
+
+        def fetch(key, reverse, limit):
+            if partitions is None:
+                return paginator.fetch_rows(queryset.values_list(*paths, named=True), key, reverse, limit)
+            return paginator.fetch_partitions([
+                (rank, [qs.values_list(*paths, named=True) for qs in querysets]) for rank, querysets in partitions
+            ], key, reverse, limit)
+
+        page = paginator.paginate_source(fetch, request)
+        results = [formatter(row) for row in page]
+        if near is not None and (fields is None or 'distance_km' in fields):
+            distances = dict(near)
+            for row, data in zip(page, results):
+                data['distance_km'] = round(distances[row.district_key], 1)
+        return paginator.get_paginated_response(results)
+
+
+# Faceted donor counts
+# TASK: GET /api/donors/facets/ — available donors per (blood group, district) for the landing page
+class DonorFacetsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        cutoff = donor_cutoff()
+        key = donor_cache_key('facets', cutoff)
+        data = cache.get(key)
+        if data is None:
+            data = self.compute(cutoff)
+            cache.set(key, data, donor_cache_timeout())
+        return Response(data)
+
+    def compute(self, cutoff):
+        # One GROUP BY over the availability predicate; marginals are summed from its cells
+        rows = (
+            available_profiles(cutoff)
+            .values('blood_group', 'district_key')
+            .annotate(district=Min('district'), count=Count('id'))
+            .order_by('blood_group', 'district_key')
+        )
+        cells = []
+        by_group = {}
+        by_district = {}
+        for row in rows:
+            cells.append({'blood_group': row['blood_group'], 'district': row['district'], 'count': row['count']})
+            by_group[row['blood_group']] = by_group.get(row['blood_group'], 0) + row['count']
+            by_district[row['district']] = by_district.get(row['district'], 0) + row['count']
+        return {
+            'total': sum(by_group.values()),
+            'by_blood_group': by_group,
+            'by_district': by_district,
+            'cells': cells,
+        }
+
+
+# District autocomplete
+# TASK: GET /api/districts/suggest/?q=<prefix>&limit=<=25 — matching districts with available donor counts
+class DistrictSuggestView(APIView):
+    permission_classes = [AllowAny]
+    max_limit = 25
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, self.max_limit))
+        return Response({'results': district_index.suggest(request.query_params.get('q', ''), limit=limit)})
 
 
 # Requests list/create
@@ -64,6 +376,10 @@ class RequestList(generics.ListCreateAPIView):
     queryset = Request.objects.all().order_by('-created_at')
     serializer_class = RequestSerializer
 
+    def get_queryset(self):
+        # Supports ?fields= sparse fieldsets on GET
+        return RequestSerializer.only_for_request(super().get_queryset(), self.request)
+
     def get_permissions(self):
         # Allow any to list; require auth for creation
         if self.request.method == 'GET':
@@ -73,13 +389,15 @@ class RequestList(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         # TASK: create request and create Notification records for matching donors
         req = serializer.save(user=self.request.user)
-        cutoff = date.today() - timedelta(days=DONOR_REST_WINDOW_DAYS)
-        # Match donors by blood group who are available per last_donation cutoff
-        matching = UserProfile.objects.select_related('user').filter(
-            blood_group__iexact=req.blood_group,
-        ).filter(models.Q(last_donation__isnull=True) | models.Q(last_donation__lt=cutoff))
-        for prof in matching:
-            Notification.objects.create(user=prof.user, request=req, message="Blood needed")
+        # Every available donor whose group can give to the requested one, in one INSERT ... SELECT,
+        # or later by `run_fanout_worker` so the response does not wait on the writes.
+        # With FANOUT_WAVES only a capped local wave goes out now; the worker widens it over time.
+        if fanout_waves():
+            start_waves(req)
+        elif fanout_async():
+            enqueue_fanout(req)
+        else:
+            notify_matching_donors(req)
 
 
 class RequestDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -88,35 +406,38 @@ class RequestDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = RequestSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_update(self, serializer):
+        req = serializer.save()
+        # Notifications show the request from their snapshot; keep it in step with edits
+        refresh_payloads(req)
+
 
 class AcceptRequestView(APIView):
     # TASK: POST /api/requests/<pk>/accept/ — mark request accepted by current user
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        req = Request.objects.filter(pk=pk).first()
-        if not req:
-            return Response({'error': 'Request not found'}, status=404)
-        if req.status != 'open':
-            return Response({'error': 'Request is not open'}, status=400)
-        req.status = 'accepted'
-        req.accepted_by = request.user
-        req.save()
-
-        # Notify requester with contact info of acceptor (respect share_phone)
-        acceptor = request.user
-        full_name = f"{acceptor.first_name} {acceptor.last_name}".strip() or acceptor.username
-        contact_email = acceptor.email
-        contact_phone = None
-        try:
-            prof = UserProfile.objects.get(user=acceptor)
-            contact_phone = prof.phone if getattr(prof, 'share_phone', False) else None
-        except UserProfile.DoesNotExist:
-            contact_phone = None
-        contact_bits = [b for b in [contact_email, contact_phone] if b]
-        contact_str = " | ".join(contact_bits) if contact_bits else ""
-        msg = f"Your request was accepted by {full_name}." + (f" Contact: {contact_str}" if contact_str else "")
-        Notification.objects.create(user=req.user, request=req, message=msg)
+        with transaction.atomic():
+            # Compare-and-set: of concurrent accepts exactly one UPDATE matches status='open'
+            won = Request.objects.filter(pk=pk, status='open').update(status='accepted', accepted_by=request.user)
+            if not won:
+                if not Request.objects.filter(pk=pk).exists():
+                    return Response({'error': 'Request not found'}, status=404)
+                return Response({'error': 'Request is not open'}, status=409)
+            req = Request.objects.select_related('accepted_by').get(pk=pk)
+            # Nobody else needs to hear about it: drop the fan-out waves still queued
+            cancel_fanout(req)
+            # Status and acceptor changed: one UPDATE re-snapshots the request's notifications
+            payload = refresh_payloads(req)
+
+            # Notify requester with contact info of acceptor (respect share_phone)
+            acceptor = payload['accepted_by']
+            contact_bits = [b for b in [acceptor['email'], acceptor['phone']] if b]
+            contact_str = " | ".join(contact_bits) if contact_bits else ""
+            msg = f"Your request was accepted by {acceptor['name']}." + (f" Contact: {contact_str}" if contact_str else "")
+            Notification.objects.create(
+                user=req.user, request=req, kind=Notification.KIND_ACCEPTED, message=msg, payload=payload,
+            )
         return Response({'status': 'accepted'})
 
 
@@ -125,36 +446,49 @@ class MarkCollectedView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        req = Request.objects.filter(pk=pk, user=request.user).first()
-        if not req:
-            return Response({'error': 'Request not found or not owned by user'}, status=404)
-        if req.status != 'accepted':
-            return Response({'error': 'Request must be accepted before collection'}, status=400)
-        req.status = 'collected'
-        req.save()
-
-        # Record donation for accepter and update their profile
-        if req.accepted_by:
-            try:
+        # One transaction, one write per table; a failure anywhere rolls the whole collection back.
+        with transaction.atomic():
+            # The acceptor's profile comes along for the payload snapshot and the donation update
+            req = (
+                Request.objects.filter(pk=pk, user=request.user)
+                .select_related('accepted_by__userprofile').first()
+            )
+            if not req:
+                return Response({'error': 'Request not found or not owned by user'}, status=404)
+            if req.status != 'accepted':
+                return Response({'error': 'Request must be accepted before collection'}, status=400)
+            # Conditional like the accept: a concurrent collect of the same request loses here
+            if not Request.objects.filter(pk=req.pk, status='accepted').update(status='collected'):
+                return Response({'error': 'Request is no longer accepted'}, status=409)
+            req.status = 'collected'
+            # Collected requests drop out of the notification list (filtered on the snapshot) and its unread badge
+            refresh_payloads(req)
+            request_left_unread(req.pk)
+
+            acceptor = req.accepted_by
+            if acceptor:
+                # Record donation for accepter and update their profile
                 Donation.objects.create(
-                    user=req.accepted_by,
+                    user=acceptor,
                     blood_group=req.blood_group,
                     hospital=req.hospital or req.city or 'Unknown'
                 )
-            except Exception:
-                logger.exception("Failed to create Donation record for accepted request")
-            try:
-                prof, _ = UserProfile.objects.get_or_create(user=req.accepted_by)
-                prof.last_donation = date.today()
-                # availability is now computed from last_donation only; do not set convenience flags
-                prof.save()
-            except Exception:
-                logger.exception("Failed to update UserProfile after marking collected")
-
-        # Notify accepter and remove related notifications
-        if req.accepted_by:
-            Notification.objects.create(user=req.accepted_by, request=req, message="Requester marked the request as collected")
-        Notification.objects.filter(request=req).delete()
+                profile = getattr(acceptor, 'userprofile', None)
+                # update() skips save() and its signals: move the donor version and
+                # refresh the donor caches here, as core.signals.profile_saved would
+                if profile is not None and UserProfile.objects.filter(pk=profile.pk).update(
+                    last_donation=date.today(), updated_at=timezone.now(),
+                ):
+                    bump_donor_version()
+                    transaction.on_commit(bump_donor_generation)
+                    index = get_donor_index()
+                    if index is not None:
+                        transaction.on_commit(lambda: index.refresh_profile(profile.pk))
+                else:
+                    UserProfile.objects.create(user=acceptor, last_donation=date.today())
+            # No notice to the acceptor: a notification of a collected request is never listed.
+            # The request's notifications are deleted later in small chunks by
+            # `manage.py prune_notifications` instead of one large DELETE here.
         return Response({'status': 'collected'})
 
 
@@ -164,44 +498,83 @@ class MyRequestsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Request.objects.filter(user=self.request.user).order_by('-created_at')
+        qs = Request.objects.filter(user=self.request.user).order_by('-created_at')
+        return RequestSerializer.only_for_request(qs, self.request)
 
 
 class NotificationsView(generics.ListAPIView):
     # TASK: GET /api/notifications/ — list current user's notifications (exclude collected requests)
+    # ?since_id=<id> returns only notifications created after that one
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        # Single-table scan: request status and details come from each row's payload snapshot
+        # (rows without one are kept; the serializer falls back to the request for them)
         qs = Notification.objects.filter(user=self.request.user)
-        qs = qs.exclude(request__status='collected')
+        qs = qs.filter(~models.Q(payload__request__status='collected') | models.Q(payload__request__isnull=True))
+        since_id = self.request.query_params.get('since_id')
+        if since_id:
+            # Incremental sync: only rows newer than the client's latest id
+            if not since_id.isdigit():
+                raise ValidationError({'since_id': 'Must be a notification id.'})
+            qs = qs.filter(id__gt=int(since_id))
+        qs = NotificationSerializer.only_for_request(qs, self.request)
         return qs.order_by('-created_at')
 
 
-class BloodInventoryList(generics.ListCreateAPIView):
+class UnreadCountView(APIView):
+    # TASK: GET /api/notifications/unread-count/ — badge count from the per-user counter row
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': unread_count(request.user.pk)})
+
+
+class MarkNotificationsReadView(APIView):
+    # TASK: POST /api/notifications/mark-read/ {"ids": [...]} — mark those notifications read
+    permission_classes = [IsAuthenticated]
+    max_ids = 1000
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValidationError({'ids': 'Must be a non-empty list of notification ids.'})
+        if len(ids) > self.max_ids:
+            raise ValidationError({'ids': f'At most {self.max_ids} ids per call.'})
+        updated = mark_read(request.user.pk, ids=ids)
+        return Response({'updated': updated, 'unread': unread_count(request.user.pk)})
+
+
+class MarkAllNotificationsReadView(APIView):
+    # TASK: POST /api/notifications/mark-all-read/ {"up_to_id": <id>} — mark everything up to that id read
+    # (omit up_to_id to mark all; pass the newest id the client has shown so later arrivals stay unread)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        up_to_id = request.data.get('up_to_id')
+        if up_to_id is not None and (not isinstance(up_to_id, int) or isinstance(up_to_id, bool)):
+            raise ValidationError({'up_to_id': 'Must be a notification id.'})
+        updated = mark_read(request.user.pk, up_to_id=up_to_id)
+        return Response({'updated': updated, 'unread': unread_count(request.user.pk)})
+
+
+class BloodInventoryList(ConditionalListMixin, generics.ListCreateAPIView):
     # TASK: GET /api/inventory/ — computed inventory of currently available donors (not DB rows)
     queryset = BloodInventory.objects.all()
     serializer_class = BloodInventorySerializer
     permission_classes = [IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
-        cutoff = date.today() - timedelta(days=DONOR_REST_WINDOW_DAYS)
-        available = UserProfile.objects.select_related('user').filter(models.Q(last_donation__isnull=True) | models.Q(last_donation__lt=cutoff))
-        donors = []
-        for prof in available:
-            user = prof.user
-            full_name = f"{user.first_name} {user.last_name}".strip() or user.username
-            donors.append({
-                'id': prof.id,
-                'username': user.username,
-                'full_name': full_name,
-                'email': user.email,
-                'phone': prof.phone if getattr(prof, 'share_phone', False) else None,
-                'blood_group': prof.blood_group,
-                'district': prof.district,
-                'last_donation': prof.last_donation,
-            })
-        return Response(donors)
+        fields = requested_fields(request, list(INVENTORY_PROJECTION.columns))
+        index = get_donor_index()
+        if index is not None and self.source_is_current(index.version()):
+            entries = sorted(index.available(), key=lambda e: e.id)
+            return Response([pick_fields(donor_inventory_data(e), fields) for e in entries])
+        # Plain tuples formatted by a precompiled projection; no model instances
+        paths, formatter = INVENTORY_PROJECTION.compile(fields)
+        rows = available_profiles().values_list(*paths)
+        return Response([formatter(row) for row in rows])
 
 
 class BloodInventoryDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -268,17 +641,22 @@ class AnalyticsView(APIView):
         request_counts = Request.objects.values('blood_group').annotate(count=Count('id'))
         demand_data = {item['blood_group']: item['count'] for item in request_counts}
         # Compute available donors per blood group from profiles
-        cutoff = date.today() - timedelta(days=DONOR_REST_WINDOW_DAYS)
-        available_qs = UserProfile.objects.filter(models.Q(last_donation__isnull=True) | models.Q(last_donation__lt=cutoff))
-        inventory_counts_qs = available_qs.values('blood_group').annotate(count=Count('id'))
-        inventory_totals = {item['blood_group']: item['count'] for item in inventory_counts_qs}
-
-        # Prepare small list of donor names per blood group for analytics
+        blood_groups = list(BLOOD_GROUPS)
         names_map = {}
-        blood_groups = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
-        for bg in blood_groups:
-            profs = available_qs.filter(blood_group__iexact=bg).select_related('user')[:50]
-            names_map[bg] = [ (f"{p.user.first_name} {p.user.last_name}".strip() or p.user.username) for p in profs ]
+        index = get_donor_index()
+        if index is not None and index.ensure_fresh():
+            inventory_totals = index.counts_by_blood_group()
+            for bg in blood_groups:
+                names_map[bg] = [e.full_name for e in index.available(blood_group=bg, limit=50)]
+        else:
+            available_qs = available_profiles()
+            inventory_counts_qs = available_qs.values('blood_group').annotate(count=Count('id'))
+            inventory_totals = {item['blood_group']: item['count'] for item in inventory_counts_qs}
+
+            # Prepare small list of donor names per blood group for analytics
+            for bg in blood_groups:
+                profs = available_qs.filter(blood_group=bg).select_related('user')[:50]
+                names_map[bg] = [ (f"{p.user.first_name} {p.user.last_name}".strip() or p.user.username) for p in profs ]
 
         response_data = {
             'blood_groups': blood_groups,
@@ -289,6 +667,17 @@ class AnalyticsView(APIView):
         return Response(response_data)
 
 
+class DonorIndexStatsView(APIView):
+    # TASK: GET /api/donors/index-stats/ — hit/miss/rebuild counters of this worker's donor index
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        index = get_donor_index()
+        if index is None:
+            return Response({'enabled': False})
+        return Response(dict(index.stats(), enabled=True))
+
+
 class UserProfileView(APIView):
     # TASK: GET/PUT /api/profile/ — read/update current user's profile (auto-clear recency flags)
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,347 @@
+"""Set-based notification fan-out for new blood requests.
+
+Creating one `Notification` per matching donor with `objects.create()` costs
+a round trip and a model instance per row. Here the matching donors are
+selected and inserted by the database itself in one `INSERT ... SELECT`
+statement, so Python never sees the individual rows. On backends that cannot
+return the inserted rows (`INSERT ... RETURNING`, e.g. MySQL) the same
+fan-out goes through `bulk_notify` instead, which writes the user ids in
+chunked `bulk_create` calls.
+
+With `FANOUT_ASYNC` on, `RequestList.perform_create` only enqueues a
+`FanoutJob`; `manage.py run_fanout_worker` claims jobs (see `claim_job`) and
+writes the notifications in id-ordered batches (see `run_job`).
+
+With `FANOUT_WAVES` on, requests are announced in waves instead of to every
+compatible donor at once: first up to `FANOUT_WAVE_SIZE` donors in the
+request's district (longest rest first), then, every `FANOUT_WAVE_INTERVAL`
+seconds while the request is still open, the next batch from a wider circle
+of districts (`WAVE_RADII_KM`, using the district gazetteer). Accepting the
+request cancels the waves that have not run yet.
+
+Benchmark with `python manage.py bench_fanout`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from core.models import FanoutJob, Notification, Request, normalize_blood_group, normalize_district
+from api.compatibility import compatible_donor_groups
+from api.notifications import add_unread, request_payload
+
+FANOUT_MESSAGE = 'Blood needed'
+BULK_BATCH_SIZE = 2000
+# Worker defaults; override with run_fanout_worker options
+JOB_BATCH_SIZE = 5000
+JOB_STALE_AFTER = 300
+JOB_MAX_ATTEMPTS = 5
+# A failed job is retried after JOB_RETRY_DELAY seconds, doubling per attempt up to JOB_RETRY_MAX_DELAY
+JOB_RETRY_DELAY = 30
+JOB_RETRY_MAX_DELAY = 3600
+# Wave n reaches districts within WAVE_RADII_KM[n] of the request's city; None = nationwide
+WAVE_RADII_KM = (0, 50, 150, None)
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job (ours was considered stale)."""
+
+
+def matching_donors(req):
+    """Available profiles whose blood group can give to `req.blood_group`."""
+    from api.donors import available_profiles
+
+    return available_profiles().filter(
+        blood_group__in=compatible_donor_groups(normalize_blood_group(req.blood_group)),
+    )
+
+
+def insert_select(queryset, columns, model=Notification, ignore_conflicts=False, returning=()):
+    """Run `INSERT INTO <model> (columns) <queryset SQL>`; returns rows inserted.
+
+    `queryset` must be a values_list() whose expressions line up with `columns`.
+    With `ignore_conflicts`, rows violating a unique constraint are skipped
+    (`ON CONFLICT DO NOTHING` / `INSERT OR IGNORE`, per backend). With
+    `returning` (field names; needs `can_return_rows_from_bulk_insert`) the
+    inserted rows come back as a list of tuples instead of a count.
+    """
+    sql, params = queryset.query.sql_with_params()
+    ops = connection.ops
+    on_conflict = OnConflict.IGNORE if ignore_conflicts else None
+    fields = [model._meta.get_field(name) for name in columns]
+    statement = '{} {} ({}) {} {}'.format(
+        ops.insert_statement(on_conflict=on_conflict),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields),
+        sql,
+        ops.on_conflict_suffix_sql(fields, on_conflict, None, None),
+    ).rstrip()
+    if returning:
+        returning_sql, returning_params = ops.return_insert_columns([model._meta.get_field(name) for name in returning])
+        statement = f'{statement} {returning_sql}'
+        params = tuple(params) + tuple(returning_params)
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        return cursor.fetchall() if returning else cursor.rowcount
+
+
+def notify_matching_donors(req, message=FANOUT_MESSAGE, profiles=None):
+    """Notify every available compatible donor of `req` in one statement; returns the count.
+
+    `profiles` narrows the donors (a subset of `matching_donors(req)`).
+    Donors who already have this request's notification are skipped by the
+    (user, request, kind) constraint, so re-running a fan-out is a no-op.
+    The insert returns the users it actually wrote to, and only those
+    counters and listeners are touched, whatever a concurrent fan-out of
+    the same request inserts meanwhile.
+    """
+    if not compatible_donor_groups(normalize_blood_group(req.blood_group)):
+        return 0
+    if profiles is None:
+        profiles = matching_donors(req)
+    rows = profiles.order_by().values_list(
+        'user_id',
+        Value(req.pk, output_field=models.BigIntegerField()),
+        Value(Notification.KIND_REQUEST, output_field=models.CharField()),
+        Value(message, output_field=models.CharField()),
+        Value(False, output_field=models.BooleanField()),
+        Value(timezone.now(), output_field=models.DateTimeField()),
+        Value(request_payload(req), output_field=models.JSONField()),
+    )
+    if not connection.features.can_return_rows_from_bulk_insert:
+        return bulk_notify(req, profiles.order_by().values_list('user_id', flat=True), message)
+    columns = ('user', 'request', 'kind', 'message', 'read', 'created_at', 'payload')
+    with transaction.atomic():
+        user_ids = [user_id for user_id, in insert_select(rows, columns, ignore_conflicts=True, returning=('user',))]
+        if user_ids:
+            add_unread(user_ids)
+            publish_after_commit(req, user_ids)
+    return len(user_ids)
+
+
+def publish_after_commit(req, user_ids):
+    """Push `req`'s new notifications for `user_ids` to stream listeners once committed.
+
+    Set-based inserts send no post_save signal, so fan-out publishes explicitly.
+    """
+    from api.broker import publish_request_notifications
+
+    transaction.on_commit(lambda: publish_request_notifications(req.pk, user_ids))
+
+
+def wave_donors(req, wave):
+    """Not-yet-notified matching donors for `wave`, longest rest first (uncapped)."""
+    from api.geo import find_district, districts_within
+
+    profiles = matching_donors(req).exclude(
+        user_id__in=Notification.objects.filter(request=req).values('user_id'),
+    )
+    radius = WAVE_RADII_KM[wave]
+    if radius is not None:
+        origin = find_district(req.city)
+        if origin is not None:
+            keys = [key for key, _ in districts_within(origin, radius)]
+        else:
+            # City missing from the gazetteer: only its exact spelling can be matched
+            keys = [normalize_district(req.city)] if radius == 0 and req.city else []
+        profiles = profiles.filter(district_key__in=keys)
+    return profiles.order_by(F('last_donation').asc(nulls_first=True), 'id')
+
+
+def notify_wave(req, wave, message=FANOUT_MESSAGE):
+    """Notify up to `FANOUT_WAVE_SIZE` donors of `wave`; returns the count."""
+    ids = list(wave_donors(req, wave).values_list('pk', flat=True)[:wave_size()])
+    if not ids:
+        return 0
+    return notify_matching_donors(req, message, matching_donors(req).filter(pk__in=ids))
+
+
+def wave_size():
+    return getattr(settings, 'FANOUT_WAVE_SIZE', 50)
+
+
+def wave_interval():
+    return timedelta(seconds=getattr(settings, 'FANOUT_WAVE_INTERVAL', 900))
+
+
+def fanout_waves():
+    return getattr(settings, 'FANOUT_WAVES', False)
+
+
+def start_waves(req, message=FANOUT_MESSAGE):
+    """Send the first (bounded) wave now and schedule the rest; returns wave 0's count."""
+    count = notify_wave(req, 0, message)
+    if len(WAVE_RADII_KM) > 1:
+        FanoutJob.objects.create(request=req, message=message, wave=1, run_after=timezone.now() + wave_interval())
+    return count
+
+
+def cancel_fanout(req):
+    """Stop every queued or running fan-out job of `req` (a running one stops at its next batch)."""
+    return FanoutJob.objects.filter(request=req, status__in=('pending', 'running')).update(
+        status='cancelled', finished_at=timezone.now(),
+    )
+
+
+def bulk_notify(req, user_ids, message=FANOUT_MESSAGE, batch_size=BULK_BATCH_SIZE):
+    """Write notifications for an iterable of user ids in chunked bulk_create calls; returns the count.
+
+    The fan-out of `notify_matching_donors` on backends without
+    `INSERT ... RETURNING`. bulk_create cannot say which rows a conflict
+    skipped, so the request row is locked instead: concurrent fan-outs of
+    one request take turns, users already notified are left out up front,
+    and the counters move by exactly the users written.
+    """
+    payload = request_payload(req)
+    with transaction.atomic():
+        list(Request.objects.select_for_update().filter(pk=req.pk).values_list('pk', flat=True))
+        notified = set(
+            Notification.objects.filter(request=req, kind=Notification.KIND_REQUEST).values_list('user_id', flat=True),
+        )
+        written = []
+        batch = []
+        for user_id in user_ids:
+            if user_id in notified:
+                continue
+            notified.add(user_id)
+            written.append(user_id)
+            batch.append(Notification(user_id=user_id, request_id=req.pk, message=message, payload=payload))
+            if len(batch) >= batch_size:
+                Notification.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            Notification.objects.bulk_create(batch, ignore_conflicts=True)
+        if written:
+            add_unread(written)
+            publish_after_commit(req, written)
+    return len(written)
+
+
+def fanout_async():
+    return getattr(settings, 'FANOUT_ASYNC', False)
+
+
+def enqueue_fanout(req, message=FANOUT_MESSAGE):
+    return FanoutJob.objects.create(request=req, message=message)
+
+
+def claimable_jobs(stale_after=JOB_STALE_AFTER):
+    """Pending jobs plus running ones whose worker stopped heartbeating, oldest first."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=stale_after)
+    return FanoutJob.objects.filter(
+        Q(status='pending') | Q(status='running', locked_at__lt=stale),
+        Q(run_after__isnull=True) | Q(run_after__lte=now),
+    ).order_by('created_at', 'id')
+
+
+def claim_job(worker_id, stale_after=JOB_STALE_AFTER):
+    """Take ownership of the next claimable job, or return None."""
+    now = timezone.now()
+    claimable = claimable_jobs(stale_after)
+    if connection.features.has_select_for_update_skip_locked:
+        # Postgres: rows other workers are claiming are skipped, not waited on
+        with transaction.atomic():
+            job = claimable.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status, job.locked_by, job.locked_at = 'running', worker_id, now
+            job.attempts += 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts'])
+            return job
+    # SQLite has no row locks: re-check claimability inside a conditional UPDATE
+    # so exactly one worker wins each job.
+    for job_id in claimable.values_list('id', flat=True)[:10]:
+        won = claimable.filter(pk=job_id).update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if won:
+            return FanoutJob.objects.get(pk=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    """Backoff before the next claim of a job whose `attempts`-th claim failed."""
+    return timedelta(seconds=min(JOB_RETRY_DELAY * 2 ** max(attempts - 1, 0), JOB_RETRY_MAX_DELAY))
+
+
+def finish_job(job, status, error=''):
+    FanoutJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status=status, error=error, finished_at=timezone.now(),
+    )
+    job.status = status
+
+
+def run_job(job, batch_size=JOB_BATCH_SIZE, max_attempts=JOB_MAX_ATTEMPTS):
+    """Write the job's notifications in batches of `batch_size` donors, resuming from `job.cursor`.
+
+    Each batch inserts its notifications and advances the cursor in one
+    transaction. Returns the number of notifications written by this call.
+    A failure puts the job back with an exponentially growing `run_after`
+    until `max_attempts` claims (of the current wave, for wave jobs) failed.
+    """
+    req = job.request
+    profiles = matching_donors(req)
+    written = 0
+    try:
+        if job.wave is not None:
+            return run_wave(job)
+        while True:
+            if not Request.objects.filter(pk=req.pk, status='open').exists():
+                # Accepted or collected meanwhile: nobody else needs to hear about it
+                finish_job(job, 'cancelled')
+                return written
+            ids = list(profiles.filter(pk__gt=job.cursor).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                finish_job(job, 'done')
+                return written
+            with transaction.atomic():
+                count = notify_matching_donors(req, job.message, profiles.filter(pk__gte=ids[0], pk__lte=ids[-1]))
+                owned = FanoutJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+                    cursor=ids[-1], notified=F('notified') + count, locked_at=timezone.now(),
+                )
+                if not owned:
+                    raise LeaseLost
+            job.cursor = ids[-1]
+            job.notified += count
+            written += count
+    except LeaseLost:
+        return written
+    except Exception as exc:
+        # Leave the job for a retry (from its last committed batch) until attempts run out
+        if job.attempts >= max_attempts:
+            finish_job(job, 'failed', error=repr(exc))
+        else:
+            FanoutJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status='pending', error=repr(exc), run_after=timezone.now() + retry_delay(job.attempts),
+            )
+        raise
+
+
+def run_wave(job):
+    """Send one wave and reschedule the job for the next one (or finish it)."""
+    req = job.request
+    if not Request.objects.filter(pk=req.pk, status='open').exists():
+        finish_job(job, 'cancelled')
+        return 0
+    with transaction.atomic():
+        count = notify_wave(req, job.wave, job.message)
+        last = job.wave + 1 >= len(WAVE_RADII_KM)
+        now = timezone.now()
+        changes = {'notified': F('notified') + count, 'locked_at': now}
+        if last:
+            changes.update(status='done', finished_at=now)
+        else:
+            # Attempts are counted per wave: the next wave's claim is its first
+            changes.update(
+                status='pending', wave=job.wave + 1, run_after=now + wave_interval(), locked_by='', attempts=0,
+            )
+        # A concurrent cancel (request accepted) wins: roll the wave back
+        if not FanoutJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(**changes):
+            raise LeaseLost
+    job.status = changes['status']
+    job.notified += count
+    return count
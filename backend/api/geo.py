@@ -0,0 +1,53 @@
+"""Proximity helpers over the district gazetteer (`core.models.District`).
+
+Profiles only store a district name, so "donors near X" becomes "donors in
+any district whose centre is within R km of X's centre". The candidate
+districts are pruned with an indexed latitude/longitude bounding box first;
+only those few rows get the exact great-circle (haversine) distance.
+"""
+import math
+
+from core.models import District, normalize_district
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two (lat, lon) points in degrees."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing every point within `radius_km`."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def find_district(value):
+    """Gazetteer row for a district name or alias, or None."""
+    key = normalize_district(value)
+    if not key:
+        return None
+    return District.objects.filter(key=key).first()
+
+
+def districts_within(origin, radius_km):
+    """[(district_key, distance_km)] for gazetteer districts within `radius_km` of `origin`, nearest first."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(origin.latitude, origin.longitude, radius_km)
+    rows = District.objects.filter(
+        latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon),
+    ).values_list('key', 'latitude', 'longitude')
+    found = []
+    for key, lat, lon in rows:
+        distance = haversine_km(origin.latitude, origin.longitude, lat, lon)
+        if distance <= radius_km:
+            found.append((key, distance))
+    found.sort(key=lambda item: (item[1], item[0]))
+    return found
@@ -0,0 +1,211 @@
+"""Unread notification counters (`core.models.NotificationCounter`).
+
+The badge used to be a `COUNT(*)` over the user's notifications joined to
+their requests. Instead each user has one counter row, adjusted inside the
+transaction of every write that changes the unread set:
+
+- new notifications: fan-out (`api.fanout`) and single creates (post_save),
+- a request becoming collected (its notifications leave the list),
+- a request being deleted (its notifications cascade away),
+- notifications being marked read (`mark_read`),
+- notifications being pruned (`prune_chunk`).
+
+Reading the badge is then one primary-key lookup. A user without a counter
+row gets one computed from the notifications table on first read (see
+`seed_unread`), so writes only ever update rows that already exist.
+
+Each notification also carries a `payload` snapshot of its request (and the
+acceptor's contact details), written with the row and refreshed in bulk by
+`refresh_payloads` when the request changes, so listing notifications never
+joins back to `Request`, `User` or `UserProfile`.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from core.models import Notification, NotificationArchive, NotificationCounter, UserProfile
+
+
+def unread_notifications(user_id):
+    """Notifications counted as unread for `user_id` (the definition the counter tracks)."""
+    return Notification.objects.filter(user_id=user_id, read=False).exclude(request__status='collected')
+
+
+def unread_count(user_id):
+    count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+    if count is not None:
+        return count
+    return seed_unread(user_id)
+
+
+def seed_unread(user_id):
+    """Create `user_id`'s counter and set it from the notifications table; returns the count.
+
+    A write that commits between a COUNT and the counter row becoming
+    visible would find no row to adjust and be lost for good. So the row is
+    committed first (holding a first estimate), after which every write
+    adjusts it; then the count is redone under the row's lock. Writes
+    blocked on that lock have not committed, so the recount excludes them
+    and their own adjustment lands after it. Must not run inside an outer
+    transaction, which would keep the row invisible.
+    """
+    try:
+        with transaction.atomic():
+            NotificationCounter.objects.create(user_id=user_id, unread=unread_notifications(user_id).count())
+    except IntegrityError:
+        # Another request created it first; recounting again is harmless
+        pass
+    with transaction.atomic():
+        counter = NotificationCounter.objects.select_for_update().get(user_id=user_id)
+        counter.unread = unread_notifications(user_id).count()
+        counter.save(update_fields=['unread'])
+    return counter.unread
+
+
+def adjust_unread(rows, sign=1):
+    """Add (`sign`=1) or subtract (-1) the unread rows of `rows` from their users' counters.
+
+    `rows` is a Notification queryset; only its unread rows are counted. One
+    UPDATE with a per-user correlated count, whatever the number of users.
+    """
+    rows = rows.filter(read=False)
+    per_user = Subquery(
+        rows.filter(user_id=OuterRef('user_id')).order_by().values('user_id').annotate(n=Count('id')).values('n'),
+        output_field=IntegerField(),
+    )
+    return NotificationCounter.objects.filter(user_id__in=rows.values('user_id')).update(
+        unread=Greatest(F('unread') + sign * Coalesce(per_user, Value(0)), Value(0)),
+    )
+
+
+def add_unread(user_ids, batch_size=2000):
+    """Count one new unread notification per occurrence of a user in `user_ids`.
+
+    For inserts that know exactly which rows they wrote (the user ids an
+    `INSERT ... RETURNING` gave back), so rows written by a concurrent
+    fan-out are never counted twice. One UPDATE per chunk of users.
+    """
+    by_count = defaultdict(list)
+    for user_id, n in Counter(user_ids).items():
+        by_count[n].append(user_id)
+    for n, users in by_count.items():
+        for start in range(0, len(users), batch_size):
+            NotificationCounter.objects.filter(user_id__in=users[start:start + batch_size]).update(
+                unread=F('unread') + n,
+            )
+
+
+def request_left_unread(request_id):
+    """Drop a request's unread notifications from the counters (it was collected or is being deleted)."""
+    return adjust_unread(Notification.objects.filter(request_id=request_id), sign=-1)
+
+
+def mark_read(user_id, ids=None, up_to_id=None):
+    """Mark `user_id`'s unread notifications read with one UPDATE; returns how many changed.
+
+    `ids` limits it to those notifications, `up_to_id` to ids <= it (a
+    cursor from the list); with neither, everything unread is marked. Only
+    rows the counter includes are touched, so the counter moves by exactly
+    the number of updated rows.
+    """
+    rows = unread_notifications(user_id)
+    if ids is not None:
+        rows = rows.filter(id__in=ids)
+    if up_to_id is not None:
+        rows = rows.filter(id__lte=up_to_id)
+    with transaction.atomic():
+        updated = rows.update(read=True)
+        if updated:
+            NotificationCounter.objects.filter(user_id=user_id).update(
+                unread=Greatest(F('unread') - updated, Value(0)),
+            )
+    return updated
+
+
+# Payload snapshots -------------------------------------------------------
+
+def acceptor_info(user):
+    """Contact details of the user who accepted a request (phone only if shared).
+
+    Uses the profile loaded with `select_related('userprofile')` when there is one.
+    """
+    if User.userprofile.related.is_cached(user):
+        loaded = getattr(user, 'userprofile', None)
+        profile = loaded and {'phone': loaded.phone, 'share_phone': loaded.share_phone}
+    else:
+        profile = UserProfile.objects.filter(user=user).values('phone', 'share_phone').first()
+    return {
+        'name': f"{user.first_name} {user.last_name}".strip() or user.username,
+        'email': user.email,
+        'phone': profile['phone'] if profile and profile['share_phone'] else None,
+    }
+
+
+def request_payload(req):
+    """Snapshot stored on `req`'s notifications: what `NotificationSerializer` renders.
+
+    `request.user` is kept so `is_owner` can be computed for the viewer.
+    """
+    return {
+        'request': {
+            'id': req.pk,
+            'user': req.user_id,
+            'blood_group': req.blood_group,
+            'hospital': req.hospital,
+            'city': req.city,
+            'address': req.address,
+            'contact_info': req.contact_info,
+            'status': req.status,
+        },
+        'accepted_by': acceptor_info(req.accepted_by) if req.accepted_by_id else None,
+    }
+
+
+def refresh_payloads(req, payload=None):
+    """Rewrite the snapshot of every notification of `req` with one UPDATE; returns the payload."""
+    payload = payload or request_payload(req)
+    Notification.objects.filter(request=req).update(payload=payload)
+    return payload
+
+
+# Retention ---------------------------------------------------------------
+
+def prunable_notifications(now=None):
+    """Notifications past retention: those of collected requests, read ones after
+    `NOTIFICATION_RETENTION_READ_DAYS`, and any after `NOTIFICATION_RETENTION_DAYS`.
+    """
+    now = now or timezone.now()
+    read_days = getattr(settings, 'NOTIFICATION_RETENTION_READ_DAYS', 30)
+    max_days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 180)
+    return Notification.objects.filter(
+        Q(request__status='collected')
+        | Q(read=True, created_at__lt=now - timedelta(days=read_days))
+        | Q(created_at__lt=now - timedelta(days=max_days))
+    )
+
+
+def prune_chunk(ids, archive=False):
+    """Delete (optionally archive first) the notifications `ids` in one transaction; returns rows removed."""
+    from api.fanout import insert_select
+
+    rows = Notification.objects.filter(id__in=ids)
+    with transaction.atomic():
+        if archive:
+            insert_select(
+                rows.order_by().values_list(
+                    'id', 'user_id', 'request_id', 'kind', 'message', 'read', 'created_at', 'payload',
+                    Value(timezone.now(), output_field=NotificationArchive._meta.get_field('archived_at')),
+                ),
+                ('id', 'user_id', 'request_id', 'kind', 'message', 'read', 'created_at', 'payload', 'archived_at'),
+                model=NotificationArchive,
+            )
+        # Unread rows of open/accepted requests are still in someone's badge
+        adjust_unread(rows.exclude(request__status='collected'), sign=-1)
+        deleted, _ = rows.delete()
+    return deleted
@@ -0,0 +1,296 @@
+"""Keyset (cursor) pagination for large public listings.
+
+OFFSET paging makes page N cost N * page_size rows of work. The paginator here
+instead remembers the ordering key of the last row it returned and asks the
+database for rows strictly after it, so every page is a bounded index seek no
+matter how deep the client scrolls.
+
+That only holds when an index returns the rows in the paging order: its
+leading columns are the equality filters and then the ordering columns, with
+a nullable one sorting NULLs first like the ORDER BY (see
+`core.models.NullsFirstIndex`). Each query of a page is also written as a
+range on the leading ordering column (`seek`), so the database starts at the
+cursor instead of filtering its way there from the first row.
+"""
+import base64
+import heapq
+import json
+from datetime import date
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginate a queryset on a stable multi-column ordering.
+
+    `ordering` lists the key columns (all ascending); the last one must be
+    unique so the ordering is total. Columns named in `nullable_fields` sort
+    NULLs first. Cursors are opaque, url-safe tokens encoding the key of the
+    boundary row plus the direction of travel.
+    """
+    ordering = ('id',)
+    nullable_fields = ()
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        def fetch(key, reverse, limit):
+            return self.fetch_rows(queryset, key, reverse, limit)
+        return self.paginate_source(fetch, request)
+
+    def fetch_rows(self, queryset, key, reverse, limit):
+        """Up to `limit` rows of `queryset` just past `key`, read segment by segment."""
+        rows = []
+        for segment in self.seek(queryset, key, reverse):
+            rows.extend(segment[:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def seek(self, queryset, key, reverse=False, ordering=None):
+        """Querysets that together hold the rows just past `key`, in travel order.
+
+        Each one is an index range: the leading ordering column is bounded
+        with >= / <= (or IS NULL / IS NOT NULL when the cursor sits among its
+        NULLs), so no page reads the rows before the cursor. A nullable
+        leading column can need two segments, one for its NULLs and one for
+        the rest, which the caller reads in turn.
+        """
+        ordering = ordering or self.ordering
+        first, rest = ordering[0], ordering[1:]
+        order = self._order_by(reverse, ordering)
+        nulls = Q(**{f'{first}__isnull': True})
+        if key is None:
+            return [queryset.order_by(*order)]
+        if key[0] is None:
+            # Among the NULLs of the leading column: the rest of the key decides
+            among_nulls = queryset.filter(nulls)
+            if rest:
+                among_nulls = among_nulls.filter(
+                    self._before(key[1:], rest) if reverse else self._after(key[1:], rest),
+                )
+            among_nulls = among_nulls.order_by(*self._order_by(reverse, rest))
+            if reverse:
+                return [among_nulls]
+            return [among_nulls, queryset.filter(~nulls).order_by(*order)]
+        bound = Q(**{f'{first}__lte' if reverse else f'{first}__gte': key[0]})
+        past = queryset.filter(bound & (self._before(key, ordering) if reverse else self._after(key, ordering)))
+        segments = [past.filter(~nulls).order_by(*order) if reverse else past.order_by(*order)]
+        if reverse and first in self.nullable_fields:
+            # NULLs sort first, so travelling backwards they come last
+            segments.append(queryset.filter(nulls).order_by(*self._order_by(reverse, rest)))
+        return segments
+
+    def paginate_source(self, fetch, request):
+        """Paginate any ordered row source, not just querysets.
+
+        `fetch(key, reverse, limit)` must return up to `limit` rows strictly
+        after `key` in `ordering` (or strictly before it, nearest first, when
+        `reverse` is true); `key` is None for the first page.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        key, reverse = self.decode_cursor(request)
+
+        rows = list(fetch(key, reverse, self.page_size + 1))
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, key is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.row_key(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(self.row_key(self.page[0]), reverse=True)
+
+    def row_key(self, row):
+        return [getattr(row, name) for name in self.ordering]
+
+    # Cursor encoding -------------------------------------------------------
+
+    def encode_cursor(self, key, reverse):
+        payload = {'k': [v.isoformat() if isinstance(v, date) else v for v in key]}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw.decode('utf-8'))
+            key = payload['k']
+            if not isinstance(key, list) or len(key) != len(self.ordering):
+                raise ValueError('cursor key has the wrong shape')
+            key = [self.parse_key_value(name, value) for name, value in zip(self.ordering, key)]
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return key, bool(payload.get('r'))
+
+    def parse_key_value(self, name, value):
+        """Turn a JSON cursor value back into the Python type of its column."""
+        if value is None:
+            if name not in self.nullable_fields:
+                raise ValueError(f'{name} cannot be null')
+            return None
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f'unexpected cursor value for {name}')
+        return value
+
+    def _link(self, key, reverse):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(key, reverse))
+
+    # Query construction ----------------------------------------------------
+
+    def _order_by(self, reverse, ordering=None):
+        exprs = []
+        for name in ordering or self.ordering:
+            nullable = name in self.nullable_fields
+            if reverse:
+                exprs.append(F(name).desc(nulls_last=True) if nullable else F(name).desc())
+            else:
+                exprs.append(F(name).asc(nulls_first=True) if nullable else F(name).asc())
+        return exprs
+
+    def _equal(self, name, value):
+        return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+    def _after(self, key, ordering=None):
+        """Rows that sort strictly after `key` (NULLs first)."""
+        ordering = ordering or self.ordering
+        clause = Q(pk__in=[])
+        for i, (name, value) in enumerate(zip(ordering, key)):
+            if value is None:
+                step = Q(**{f'{name}__isnull': False})
+            else:
+                step = Q(**{f'{name}__gt': value})
+            for prev_name, prev_value in zip(ordering[:i], key[:i]):
+                step &= self._equal(prev_name, prev_value)
+            clause |= step
+        return clause
+
+    def _before(self, key, ordering=None):
+        """Rows that sort strictly before `key` (NULLs first)."""
+        ordering = ordering or self.ordering
+        clause = Q(pk__in=[])
+        for i, (name, value) in enumerate(zip(ordering, key)):
+            if value is None:
+                # Nothing sorts before NULL in this column
+                continue
+            step = Q(**{f'{name}__lt': value})
+            if name in self.nullable_fields:
+                step |= Q(**{f'{name}__isnull': True})
+            for prev_name, prev_value in zip(ordering[:i], key[:i]):
+                step &= self._equal(prev_name, prev_value)
+            clause |= step
+        return clause
+
+
+class DonorCursorPagination(KeysetPagination):
+    """Public donor search: longest-rested donors first, then by id."""
+    ordering = ('last_donation', 'id')
+    nullable_fields = ('last_donation',)
+    page_size = 20
+    max_page_size = 100
+
+
+class RankedKeysetPagination(KeysetPagination):
+    """Keyset paging on (rank, *tail) where rank is a small integer computed per partition.
+
+    Sorting every matching row by a computed rank defeats the index. Instead
+    the caller splits the rows into partitions that an index returns in
+    `tail` order (one blood group, one district, ...) and tags each with its
+    rank. A page seeks the partitions of the cursor's rank and merges them,
+    moving on to the next rank only while the page is not full, so every
+    query is a bounded index range.
+    """
+
+    def tail_key(self, row):
+        # NULLs first, like the ORDER BY
+        key = []
+        for name in self.ordering[1:]:
+            value = getattr(row, name)
+            key.append((value is not None, value) if name in self.nullable_fields else value)
+        return key
+
+    def fetch_partitions(self, partitions, key, reverse, limit):
+        """Rows just past `key` from `partitions`, a list of (rank, [queryset, ...]).
+
+        Querysets must select the rank under `ordering[0]`; rows of one
+        partition must share it.
+        """
+        tail = self.ordering[1:]
+        rows = []
+        ranks = sorted(partitions, key=lambda part: part[0], reverse=reverse)
+        for rank, querysets in ranks:
+            if key is not None and (rank < key[0] if not reverse else rank > key[0]):
+                continue
+            tail_key = key[1:] if key is not None and rank == key[0] else None
+            wanted = limit - len(rows)
+            runs = []
+            for queryset in querysets:
+                run = []
+                for segment in self.seek(queryset, tail_key, reverse, tail):
+                    run.extend(segment[:wanted - len(run)])
+                    if len(run) >= wanted:
+                        break
+                runs.append(run)
+            rows.extend(row for _, row in zip(range(wanted), heapq.merge(*runs, key=self.tail_key, reverse=reverse)))
+            if len(rows) >= limit:
+                break
+        return rows
+
+
+class CompatibleDonorCursorPagination(RankedKeysetPagination):
+    """Compatibility search: exact group first (match_rank 0), then longest rest, then id."""
+    ordering = ('match_rank', 'last_donation', 'id')
+    nullable_fields = ('last_donation',)
+    page_size = 20
+    max_page_size = 100
+
+
+class NearbyDonorCursorPagination(RankedKeysetPagination):
+    """Proximity search: nearest district first (distance_rank), then longest rest, then id."""
+    ordering = ('distance_rank', 'last_donation', 'id')
+    nullable_fields = ('last_donation',)
+    page_size = 20
+    max_page_size = 100
@@ -0,0 +1,93 @@
+"""Projection-based read path for large read-only lists.
+
+A ModelSerializer builds a model instance per row (plus the related User) and
+then walks every field, including SerializerMethodFields. For read-only lists
+we can skip all of that: fetch plain tuples with `values_list()` and turn each
+one into the output dict with a formatter compiled once per request.
+
+A `Projection` lists output columns in order, each with the model paths it
+reads and an optional function combining those values. The output of the
+projections below must stay byte-identical to the serializer/dicts they
+replace; `manage.py bench_serializers` checks that while measuring speed.
+"""
+from operator import itemgetter
+
+
+class Projection:
+    def __init__(self, columns):
+        # name -> (paths, fn); fn(*values) builds the output value, None passes the single path through
+        self.columns = columns
+
+    def compile(self, fields=None, extra_paths=()):
+        """Return (paths, formatter) for `fields` (None = every column).
+
+        `paths` is the values_list() column list (starting with `extra_paths`,
+        e.g. keyset ordering keys the caller reads itself); `formatter(row)`
+        builds the output dict from one fetched tuple.
+        """
+        paths = list(extra_paths)
+        positions = {path: i for i, path in enumerate(paths)}
+        getters = []
+        for name in (fields if fields is not None else self.columns):
+            sources, fn = self.columns[name]
+            idx = []
+            for path in sources:
+                if path not in positions:
+                    positions[path] = len(paths)
+                    paths.append(path)
+                idx.append(positions[path])
+            if fn is None:
+                getters.append((name, itemgetter(idx[0])))
+            elif len(idx) == 1:
+                getters.append((name, _apply_one(fn, idx[0])))
+            else:
+                getters.append((name, _apply_many(fn, itemgetter(*idx))))
+
+        def formatter(row):
+            return {name: get(row) for name, get in getters}
+
+        return paths, formatter
+
+
+def _apply_one(fn, i):
+    return lambda row: fn(row[i])
+
+
+def _apply_many(fn, pick):
+    return lambda row: fn(*pick(row))
+
+
+def display_name(first_name, last_name, username):
+    return f"{first_name or ''} {last_name or ''}".strip() or username
+
+
+def shared_phone(phone, share_phone):
+    return phone if share_phone else None
+
+
+def iso_date(value):
+    return value.isoformat() if value is not None else None
+
+
+# Mirrors PublicDonorProfileSerializer
+PUBLIC_DONOR_PROJECTION = Projection({
+    'username': (('user__username',), None),
+    'full_name': (('user__first_name', 'user__last_name', 'user__username'), display_name),
+    'email': (('user__email',), None),
+    'blood_group': (('blood_group',), None),
+    'district': (('district',), None),
+    'last_donation': (('last_donation',), iso_date),
+    'phone': (('phone', 'share_phone'), shared_phone),
+})
+
+# Mirrors the rows of BloodInventoryList (dates are left for the JSON renderer)
+INVENTORY_PROJECTION = Projection({
+    'id': (('id',), None),
+    'username': (('user__username',), None),
+    'full_name': (('user__first_name', 'user__last_name', 'user__username'), display_name),
+    'email': (('user__email',), None),
+    'phone': (('phone', 'share_phone'), shared_phone),
+    'blood_group': (('blood_group',), None),
+    'district': (('district',), None),
+    'last_donation': (('last_donation',), None),
+})
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from core.models import normalize_blood_group, clean_district
 import re
 import logging
 
@@ -20,6 +21,12 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         extra_kwargs = {'password': {'write_only': True}}
 
+    def validate_blood_group(self, value):
+        return normalize_blood_group(value)
+
+    def validate_district(self, value):
+        return clean_district(value)
+
     def _slugify(self, text: str) -> str:
         s = (text or '').strip().lower()
         s = re.sub(r"[^a-z0-9]+", "_", s)
@@ -86,6 +93,12 @@ class AdminUserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['username', 'is_staff', 'is_superuser']
 
+    def validate_blood_group(self, value):
+        return normalize_blood_group(value)
+
+    def validate_district(self, value):
+        return clean_district(value)
+
     def update(self, instance, validated_data):
         logging.debug(f"AdminUserSerializer.update user={instance.id}")
         instance.email = validated_data.get('email', instance.email)
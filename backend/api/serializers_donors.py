@@ -1,6 +1,10 @@
 from rest_framework import serializers
-from core.models import Request, BloodInventory, Donation, UserProfile, Notification
+from core.models import (
+    Request, BloodInventory, Donation, UserProfile, Notification,
+    normalize_blood_group, clean_district,
+)
 from django.contrib.auth.models import User
+from api.sparse import SparseFieldsetMixin
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -10,7 +14,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfile
-    fields = ['username', 'email', 'phone', 'blood_group', 'last_donation', 'district', 'share_phone']
+        fields = ['username', 'email', 'phone', 'blood_group', 'last_donation', 'district', 'share_phone']
 
     def update(self, instance, validated_data):
         instance.phone = validated_data.get('phone', instance.phone)
@@ -21,6 +25,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+    def validate_blood_group(self, value):
+        return normalize_blood_group(value)
+
+    def validate_district(self, value):
+        return clean_district(value)
+
     def validate(self, attrs):
         if 'last_donation' in attrs and attrs.get('last_donation') in ('', None):
             attrs['last_donation'] = None
@@ -34,12 +44,22 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class PublicDonorProfileSerializer(serializers.ModelSerializer):
+class PublicDonorProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username')
     full_name = serializers.SerializerMethodField()
     email = serializers.EmailField(source='user.email')
     phone = serializers.SerializerMethodField()
 
+    sparse_field_sources = {
+        'username': ('user__username',),
+        'full_name': ('user__first_name', 'user__last_name', 'user__username'),
+        'email': ('user__email',),
+        'blood_group': ('blood_group',),
+        'district': ('district',),
+        'last_donation': ('last_donation',),
+        'phone': ('phone', 'share_phone'),
+    }
+
     class Meta:
         model = UserProfile
         fields = ['username', 'full_name', 'email', 'blood_group', 'district', 'last_donation', 'phone']
@@ -54,7 +74,15 @@ class PublicDonorProfileSerializer(serializers.ModelSerializer):
         return full or getattr(obj.user, 'username', '')
 
 
-class RequestSerializer(serializers.ModelSerializer):
+class RequestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    sparse_field_sources = {
+        name: (name,) for name in [
+            'id', 'user', 'blood_group', 'city', 'urgency',
+            'hospital', 'cause', 'address', 'contact_info',
+            'status', 'accepted_by', 'created_at'
+        ]
+    }
+
     class Meta:
         model = Request
         fields = [
@@ -87,20 +115,40 @@ class DonationSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'donation_date']
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     request_info = serializers.SerializerMethodField()
     accepted_by_info = serializers.SerializerMethodField()
 
+    sparse_field_sources = {
+        'id': ('id',),
+        'user': ('user',),
+        'request': ('request',),
+        'kind': ('kind',),
+        'message': ('message',),
+        'read': ('read',),
+        'created_at': ('created_at',),
+        'request_info': ('payload',),
+        'accepted_by_info': ('payload',),
+    }
+
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'request', 'message', 'read', 'created_at', 'request_info', 'accepted_by_info']
+        fields = ['id', 'user', 'request', 'kind', 'message', 'read', 'created_at', 'request_info', 'accepted_by_info']
         read_only_fields = ['user', 'created_at']
 
+    # Rendered from the row's payload snapshot; rows without one fall back to the request
     def get_request_info(self, obj):
+        req = self.context.get('request')
+        snapshot = (obj.payload or {}).get('request')
+        if snapshot is not None:
+            info = {key: snapshot[key] for key in (
+                'id', 'blood_group', 'hospital', 'city', 'address', 'contact_info', 'status',
+            )}
+            info['is_owner'] = bool(req and getattr(req, 'user', None) and snapshot['user'] == req.user.id)
+            return info
         if not obj.request:
             return None
         r = obj.request
-        req = self.context.get('request')
         is_owner = bool(req and getattr(req, 'user', None) and r.user_id == req.user.id)
         return {
             'id': r.id,
@@ -114,13 +162,15 @@ class NotificationSerializer(serializers.ModelSerializer):
         }
 
     def get_accepted_by_info(self, obj):
+        if obj.payload:
+            return obj.payload.get('accepted_by')
         r = getattr(obj, 'request', None)
         if not r or not r.accepted_by:
             return None
         user = r.accepted_by
         phone = None
         try:
-            prof = UserProfile.objects.get(user=user)
+            prof = user.userprofile
             phone = prof.phone if getattr(prof, 'share_phone', False) else None
         except UserProfile.DoesNotExist:
             phone = None
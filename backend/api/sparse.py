@@ -0,0 +1,76 @@
+"""Sparse fieldsets: `?fields=a,b,c` on list endpoints.
+
+Clients that only need a few attributes per row ask for them explicitly; the
+serializer drops the other fields and the view narrows the SELECT column list
+with `.only()` so the database returns proportionally narrower rows.
+
+Serializers opt in with `SparseFieldsetMixin` and declare, per output field,
+the model paths needed to render it (`sparse_field_sources`).
+"""
+from rest_framework.exceptions import ValidationError
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def requested_fields(request, available):
+    """Return the requested subset of `available` (in `available` order), or None for all.
+
+    Only GET requests are trimmed. Unknown names are a client error.
+    """
+    if request is None or request.method != 'GET':
+        return None
+    raw = request.query_params.get(FIELDS_QUERY_PARAM)
+    if not raw:
+        return None
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = sorted(names.difference(available))
+    if unknown:
+        raise ValidationError({FIELDS_QUERY_PARAM: f"Unknown field(s): {', '.join(unknown)}"})
+    return [name for name in available if name in names]
+
+
+def only_columns(queryset, sources, fields, always=()):
+    """Restrict `queryset` to the columns needed for `fields` (None = leave untouched).
+
+    `always` lists columns the caller reads itself (e.g. keyset ordering keys).
+    Related paths keep their foreign key; select_related() is dropped when no
+    related column is needed anymore.
+    """
+    if fields is None:
+        return queryset
+    columns = set(always)
+    for name in fields:
+        columns.update(sources[name])
+    relations = {column.split('__', 1)[0] for column in columns if '__' in column}
+    columns.update(relations)
+    if not relations:
+        queryset = queryset.select_related(None)
+    return queryset.only(*sorted(columns))
+
+
+def pick_fields(data, fields):
+    """Trim a hand-built row dict to `fields` (None keeps everything)."""
+    if fields is None:
+        return data
+    return {name: data[name] for name in fields}
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin dropping fields not named in the request's `?fields=`."""
+
+    # output field name -> model paths (relative to the serialized model) it reads
+    sparse_field_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'), list(self.fields))
+        if fields is not None:
+            for name in list(self.fields):
+                if name not in fields:
+                    self.fields.pop(name)
+
+    @classmethod
+    def only_for_request(cls, queryset, request, always=()):
+        """Apply `.only()` for the fields this request asked for."""
+        fields = requested_fields(request, list(cls.sparse_field_sources))
+        return only_columns(queryset, cls.sparse_field_sources, fields, always)
@@ -0,0 +1,122 @@
+"""Server-Sent Events stream of new notifications.
+
+Served by the ASGI entry point (`blood_donation.asgi`): each open connection
+is one coroutine parked on its broker subscription (see `api.broker`), so
+idle clients cost no requests and no threads. Under WSGI the view refuses
+with 501 instead of pinning a worker per connection; clients then keep
+polling `notifications/`. It refuses the same way when the broker cannot
+carry notifications written by the fan-out worker (see `api.broker`).
+
+`EventSource` cannot send an Authorization header, and a JWT in the URL
+would end up in access logs. Clients first POST `notifications/stream/ticket/`
+with their token and open the stream with `?ticket=`: a signed user id that
+is only accepted for `NOTIFICATION_STREAM_TICKET_MAX_AGE` seconds.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from core.models import Notification
+from api.broker import get_broker, notification_event
+from api.fanout import fanout_async, fanout_waves
+
+REPLAY_LIMIT = 100
+TICKET_SALT = 'api.stream.ticket'
+
+
+def ticket_max_age():
+    return getattr(settings, 'NOTIFICATION_STREAM_TICKET_MAX_AGE', 60)
+
+
+def issue_ticket(user):
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(str(user.pk))
+
+
+def authenticate_stream(request):
+    """User from a SimpleJWT access token in the Authorization header or a `?ticket=`, else None."""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        try:
+            user_id = signing.TimestampSigner(salt=TICKET_SALT).unsign(ticket, max_age=ticket_max_age())
+        except signing.BadSignature:
+            return None
+        return User.objects.filter(pk=user_id).first()
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw = auth.get_raw_token(header) if header else None
+    if raw is None:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def missed_notifications(user_id, last_id):
+    rows = Notification.objects.filter(user_id=user_id, id__gt=last_id).order_by('id')[:REPLAY_LIMIT]
+    return [notification_event(n) for n in rows]
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(event)}\n\n"
+
+
+# TASK: POST /api/notifications/stream/ticket/ — short-lived credential for opening the stream
+class NotificationStreamTicketView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({'ticket': issue_ticket(request.user), 'expires_in': ticket_max_age()})
+
+
+# TASK: GET /api/notifications/stream/ — push the signed-in user's new notifications (text/event-stream)
+class NotificationStreamView(View):
+    keepalive_seconds = 15
+
+    async def get(self, request):
+        if isinstance(request, WSGIRequest):
+            return JsonResponse({'error': 'Notification streaming needs the ASGI server'}, status=501)
+        if not get_broker().cross_process and (fanout_async() or fanout_waves()):
+            # The worker's notifications would never reach this process's listeners
+            return JsonResponse({'error': 'Notification streaming needs a cross-process broker'}, status=501)
+        user = await sync_to_async(authenticate_stream)(request)
+        if user is None or not user.is_active:
+            return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+        last_id = request.headers.get('Last-Event-ID', '')
+        response = StreamingHttpResponse(
+            self.events(user.pk, int(last_id) if last_id.isdigit() else None),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, user_id, last_id):
+        subscription = get_broker().subscribe(user_id)
+        try:
+            yield 'retry: 5000\n\n'
+            if last_id is not None:
+                # Reconnect: replay what was created while the client was away
+                for event in await sync_to_async(missed_notifications)(user_id, last_id):
+                    last_id = event['id']
+                    yield format_event(event)
+            while True:
+                event = await subscription.get(timeout=self.keepalive_seconds)
+                if event is None:
+                    yield ': keepalive\n\n'
+                elif last_id is None or event['id'] > last_id:
+                    # (skips events already sent by the replay above)
+                    yield format_event(event)
+        finally:
+            subscription.close()
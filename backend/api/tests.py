@@ -0,0 +1,630 @@
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from io import StringIO
+from threading import Barrier
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request as APIRequest
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.management.commands.bench_serializers import legacy_inventory_rows
+from core.models import Donation, FanoutJob, Notification, NotificationArchive, NotificationCounter, Request, UserProfile
+from api import fanout, notifications
+from api.broker import PostgresBroker
+from api.conditional import bump_donor_version, donor_version
+from api.donor_index import DonorAvailabilityIndex, get_donor_index
+from api.districts import DistrictSuggestIndex
+from api.donors import AcceptRequestView, MarkCollectedView, NotificationsView, RequestList, available_profiles
+from api.projections import INVENTORY_PROJECTION, PUBLIC_DONOR_PROJECTION
+from api.serializers_donors import NotificationSerializer, PublicDonorProfileSerializer
+from api.stream import NotificationStreamTicketView, authenticate_stream
+
+
+def make_donor(username, blood_group='O-', district='Dhaka', last_donation=None, **profile):
+    user = User.objects.create_user(username, email=f'{username}@example.com', first_name=username.title())
+    UserProfile.objects.create(
+        user=user, blood_group=blood_group, district=district, last_donation=last_donation, **profile,
+    )
+    return user
+
+
+class ProfileNormalizationTests(TestCase):
+    def test_orm_save_stores_canonical_values(self):
+        user = User.objects.create_user('donor')
+        profile = UserProfile.objects.create(user=user, blood_group=' o + ', district='  cox   bazar ')
+        profile.refresh_from_db()
+        self.assertEqual((profile.blood_group, profile.district, profile.district_key), ('O+', 'cox bazar', 'COX BAZAR'))
+
+    def test_raw_fixture_load_stores_canonical_values(self):
+        user = User.objects.create_user('donor')
+        fixture = [{'model': 'core.userprofile', 'pk': 1, 'fields': {
+            'user': user.pk, 'blood_group': 'ab-', 'district': ' Jhenaidah',
+        }}]
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as handle:
+            json.dump(fixture, handle)
+            handle.flush()
+            call_command('loaddata', handle.name, verbosity=0)
+        profile = UserProfile.objects.get(pk=1)
+        self.assertEqual((profile.blood_group, profile.district, profile.district_key), ('AB-', 'Jhenaidah', 'JHENAIDAH'))
+        self.assertIsNotNone(profile.updated_at)
+
+    def test_prod_fixture_loads(self):
+        # build.sh / render_build.sh load it when LOAD_FIXTURE=True
+        call_command('loaddata', settings.BASE_DIR.parent / 'prod_fixture.json', verbosity=0)
+        self.assertEqual(
+            list(UserProfile.objects.values_list('blood_group', 'district_key')), [('O+', 'JHENAIDAH')],
+        )
+
+
+class ConditionalSearchTests(TestCase):
+    url = '/api/donors/search/?blood_group=O-'
+
+    def setUp(self):
+        cache.clear()
+        self.donor = make_donor('donor')
+
+    def test_not_modified_is_one_query(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_profile_write_changes_etag_and_body(self):
+        first = self.client.get(self.url)
+        UserProfile.objects.filter(user=self.donor).get().save(update_fields=['district'])
+        make_donor('second')
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual([row['username'] for row in second.json()['results']], ['donor', 'second'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=second['ETag']).status_code, 304)
+
+    def test_write_by_another_worker_is_served_from_the_database(self):
+        index = get_donor_index()
+        index.rebuild()
+        self.assertEqual(index.version(), donor_version())
+        # A signal-less insert plus a bump is what another worker's write looks like from here
+        user = User.objects.create_user('elsewhere')
+        UserProfile.objects.bulk_create([UserProfile(user=user, blood_group='O-', district_key='DHAKA')])
+        bump_donor_version()
+        self.assertNotEqual(index.version(), donor_version())
+        rows = self.client.get(self.url).json()['results']
+        self.assertEqual(sorted(row['username'] for row in rows), ['donor', 'elsewhere'])
+
+    def test_cutoff_change_changes_etag_and_body(self):
+        resting = make_donor('resting', last_donation=date.today() - timedelta(days=1))
+        first = self.client.get(self.url)
+        self.assertEqual([row['username'] for row in first.json()['results']], ['donor'])
+        # The next day's cutoff lets the resting donor back in without any write
+        with override_settings(DONOR_INDEX_ENABLED=False), \
+                mock.patch('api.donors.donor_cutoff', return_value=date.today() + timedelta(days=1)):
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual([row['username'] for row in second.json()['results']], ['donor', resting.username])
+
+
+@override_settings(DONOR_INDEX_ENABLED=False)
+class DonorSearchTests(TestCase):
+    url = '/api/donors/search/'
+
+    def setUp(self):
+        cache.clear()
+        today = date.today()
+        # (last_donation, id) order: never donated first, then oldest donation
+        self.a_pos = make_donor('a_pos', blood_group='A+', last_donation=today - timedelta(days=400))
+        self.o_neg = make_donor('o_neg', blood_group='O-')
+        self.a_neg = make_donor('a_neg', blood_group='A-', last_donation=today - timedelta(days=300), district='Khulna')
+        self.a_pos_new = make_donor('a_pos_new', blood_group='A+')
+        self.b_pos = make_donor('b_pos', blood_group='B+')
+        make_donor('resting', blood_group='A+', last_donation=today)
+
+    def walk(self, params, page_size=1):
+        """Follow `next` to the end and `previous` back; returns (forward, backward) usernames."""
+        response = self.client.get(self.url, {**params, 'page_size': page_size}).json()
+        self.assertIsNone(response['previous'])
+        pages = [response]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+        forward = [row['username'] for page in pages for row in page['results']]
+        backward = []
+        page = pages[-1]
+        while page['previous']:
+            page = self.client.get(page['previous']).json()
+            backward[:0] = [row['username'] for row in page['results']]
+        self.assertEqual(backward, forward[:len(forward) - len(pages[-1]['results'])])
+        return forward
+
+    def test_cursor_pages_forward_and_back(self):
+        for enabled in (False, True):
+            with self.subTest(index=enabled), override_settings(DONOR_INDEX_ENABLED=enabled):
+                if enabled:
+                    get_donor_index().rebuild()
+                self.assertEqual(self.walk({'blood_group': 'a+'}), ['a_pos_new', 'a_pos'])
+                self.assertEqual(
+                    self.walk({}, page_size=2), ['o_neg', 'a_pos_new', 'b_pos', 'a_pos', 'a_neg'],
+                )
+
+    def test_malformed_cursor_is_not_found(self):
+        for cursor in ('!!', 'eyJrIjpbMV19', 'eyJrIjpbbnVsbCxudWxsXX0'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'blood_group': 'A+', 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_recipient_group_expands_to_compatible_donors_exact_first(self):
+        self.assertEqual(self.walk({'recipient_group': 'a+'}), ['a_pos_new', 'a_pos', 'o_neg', 'a_neg'])
+        self.assertEqual(self.walk({'recipient_group': 'O-'}), ['o_neg'])
+        response = self.client.get(self.url, {'recipient_group': 'C+'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_top_k_ranks_district_then_exact_group_then_rest(self):
+        response = self.client.get(self.url, {'recipient_group': 'A+', 'district': 'Khulna', 'top': 3})
+        # In-district beats exact group; among the rest, exact group and a longer rest win
+        self.assertEqual([row['username'] for row in response.json()['results']], ['a_neg', 'a_pos_new', 'a_pos'])
+        response = self.client.get(self.url, {'blood_group': 'A+', 'top': 10})
+        self.assertEqual([row['username'] for row in response.json()['results']], ['a_pos_new', 'a_pos', 'o_neg', 'a_neg'])
+
+    def test_fields_selects_columns_and_rejects_unknown_names(self):
+        response = self.client.get(self.url, {'blood_group': 'O-', 'fields': 'district, username'})
+        self.assertEqual(response.json()['results'], [{'username': 'o_neg', 'district': 'Dhaka'}])
+        response = self.client.get(self.url, {'blood_group': 'O-', 'fields': 'username,password,id'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': 'Unknown field(s): id, password'})
+        # distance_km only exists in proximity mode
+        response = self.client.get(self.url, {'blood_group': 'O-', 'fields': 'distance_km'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_projection_renders_like_the_serializer(self):
+        UserProfile.objects.filter(user=self.a_pos).update(phone='01700000000', share_phone=True)
+        UserProfile.objects.filter(user=self.o_neg).update(phone='01800000000', share_phone=False)
+        User.objects.filter(pk=self.a_neg.pk).update(first_name='', last_name='')
+        queryset = available_profiles().order_by('id')
+        paths, formatter = PUBLIC_DONOR_PROJECTION.compile()
+        projected = [formatter(row) for row in queryset.values_list(*paths)]
+        serialized = PublicDonorProfileSerializer(queryset.select_related('user'), many=True).data
+        render = JSONRenderer().render
+        self.assertEqual(render(projected), render(serialized))
+        paths, formatter = INVENTORY_PROJECTION.compile()
+        projected = [formatter(row) for row in queryset.values_list(*paths)]
+        self.assertEqual(render(projected), render(legacy_inventory_rows(queryset)))
+
+
+class DonorIndexTests(TestCase):
+    def test_first_build_runs_in_the_background(self):
+        make_donor('donor')
+        index = DonorAvailabilityIndex()
+        with mock.patch('api.donor_index.threading.Thread') as thread:
+            self.assertFalse(index.ensure_fresh())
+            # Callers read the database meanwhile
+            self.assertIsNone(index.version())
+        thread.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs['target'], index._rebuild_in_background)
+        index.rebuild()
+        self.assertEqual(index.version(), donor_version())
+        self.assertEqual([e.username for e in index.available()], ['donor'])
+
+    def test_writes_during_a_load_are_replayed_before_the_swap(self):
+        donor = make_donor('donor')
+        index = DonorAvailabilityIndex()
+        load = index._load
+
+        def load_then_write():
+            loaded = load()
+            # Lands after the snapshot was read, as a concurrent request would
+            profile = UserProfile.objects.get(user=donor)
+            profile.blood_group = 'A+'
+            profile.save()
+            # What the on_commit hook in core.signals does
+            index.refresh_profile(profile.pk)
+            return loaded
+
+        with mock.patch.object(index, '_load', load_then_write):
+            index.rebuild()
+        self.assertEqual([e.blood_group for e in index.available()], ['A+'])
+        self.assertEqual(index.version(), donor_version())
+
+
+class DistrictSuggestTests(TestCase):
+    def test_database_answers_until_the_background_build_lands(self):
+        make_donor('donor', district='Dhaka')
+        make_donor('resting', district='Dhaka', last_donation=date.today())
+        index = DistrictSuggestIndex()
+        with mock.patch('api.districts.threading.Thread') as thread:
+            self.assertEqual(index.suggest('dha'), [{'district': 'Dhaka', 'donors': 1}])
+        thread.assert_called_once()
+        build = thread.call_args.kwargs
+        with mock.patch('api.districts.connection'):
+            build['target'](*build['args'])
+        with self.assertNumQueries(0):
+            self.assertEqual(index.suggest('dhak'), [{'district': 'Dhaka', 'donors': 1}])
+
+
+class WaveFanoutTests(TestCase):
+    @override_settings(FANOUT_WAVES=True)
+    def test_request_for_city_outside_gazetteer(self):
+        owner = User.objects.create_user('owner')
+        local = make_donor('local', district='Atlantis')
+        make_donor('elsewhere', district='Dhaka')
+        request = APIRequestFactory().post(
+            '/api/requests/', {'blood_group': 'O-', 'city': 'Atlantis', 'contact_info': '01700000000'}, format='json',
+        )
+        force_authenticate(request, owner)
+        response = RequestList.as_view()(request)
+        self.assertEqual(response.status_code, 201)
+        req = Request.objects.get(pk=response.data['id'])
+        # First wave: only the exact district spelling; the worker widens it later
+        self.assertEqual(list(Notification.objects.filter(request=req).values_list('user_id', flat=True)), [local.pk])
+        self.assertTrue(FanoutJob.objects.filter(request=req, wave=1, status='pending').exists())
+
+
+class FanoutRetryTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner')
+        self.req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+
+    def claim_and_fail(self):
+        job = fanout.claim_job('worker')
+        with mock.patch.object(fanout, 'notify_matching_donors', side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            fanout.run_job(job)
+        job.refresh_from_db()
+        return job
+
+    def test_failures_back_off_exponentially(self):
+        make_donor('donor')
+        FanoutJob.objects.create(request=self.req, message='m')
+        job = self.claim_and_fail()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIsNone(fanout.claim_job('worker'))
+        delays = [job.run_after]
+        for _ in range(2):
+            FanoutJob.objects.filter(pk=job.pk).update(run_after=None)
+            job = self.claim_and_fail()
+            delays.append(job.run_after)
+        now = timezone.now()
+        self.assertEqual([round((d - now).total_seconds() / 30) for d in delays], [1, 2, 4])
+
+    def test_waves_count_attempts_separately(self):
+        job = FanoutJob.objects.create(request=self.req, message='m', wave=1, attempts=4)
+        FanoutJob.objects.filter(pk=job.pk).update(status='running', locked_by='worker', attempts=4)
+        job.refresh_from_db()
+        fanout.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.wave, job.attempts), ('pending', 2, 0))
+
+
+class NotificationsViewQueryTests(TestCase):
+    """The list is one query over donors_notification, whatever the rows or `fields=`."""
+
+    def setUp(self):
+        self.donor = make_donor('donor')
+        owner = User.objects.create_user('owner')
+        with_profile = make_donor('acceptor', share_phone=True, phone='01700000000')
+        without_profile = User.objects.create_user('noprofile')
+        notifications = []
+        for i in range(200):
+            req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+            if i % 3:
+                Request.objects.filter(pk=req.pk).update(
+                    status='accepted', accepted_by=with_profile if i % 3 == 1 else without_profile,
+                )
+                req.refresh_from_db()
+            notifications.append(Notification(user=self.donor, request=req, message='Blood needed'))
+        for notification in notifications:
+            notification.save()
+
+    def list(self, query=''):
+        request = APIRequestFactory().get('/api/notifications/' + query)
+        force_authenticate(request, self.donor)
+        return NotificationsView.as_view()(request)
+
+    def test_query_count_is_fixed(self):
+        variants = [None] + [[name] for name in NotificationSerializer.sparse_field_sources] + [
+            ['id', 'request_info', 'accepted_by_info'],
+        ]
+        for fields in variants:
+            with self.subTest(fields=fields):
+                with self.assertNumQueries(1):
+                    response = self.list(f'?fields={",".join(fields)}' if fields else '')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data), 200)
+
+    def test_acceptor_with_and_without_profile(self):
+        with self.assertNumQueries(1):
+            rows = self.list('?fields=request_info,accepted_by_info').data
+        acceptors = {str(row['accepted_by_info']) for row in rows}
+        self.assertEqual(acceptors, {
+            'None',
+            str({'name': 'Acceptor', 'email': 'acceptor@example.com', 'phone': '01700000000'}),
+            str({'name': 'noprofile', 'email': '', 'phone': None}),
+        })
+
+
+class UnreadCounterTests(TestCase):
+    def test_seed_counts_notification_written_before_counter_exists(self):
+        donor = make_donor('donor')
+        owner = User.objects.create_user('owner')
+        Notification.objects.create(
+            user=donor, request=Request.objects.create(user=owner, blood_group='O-', contact_info='c'), message='m',
+        )
+        count_unread = notifications.unread_notifications
+        calls = []
+
+        class RacingRows:
+            def __init__(self, user_id):
+                self.rows = count_unread(user_id)
+
+            def count(self):
+                count = self.rows.count()
+                if not calls:
+                    # A fan-out commits right after the first COUNT, before the counter row exists
+                    Notification.objects.create(
+                        user=donor, message='m',
+                        request=Request.objects.create(user=owner, blood_group='O-', contact_info='c'),
+                    )
+                calls.append(count)
+                return count
+
+        def racing_count(user_id):
+            return RacingRows(user_id)
+
+        with mock.patch.object(notifications, 'unread_notifications', racing_count):
+            self.assertEqual(notifications.unread_count(donor.pk), 2)
+        self.assertEqual(notifications.unread_count(donor.pk), 2)
+
+
+    def test_fanout_counts_only_the_rows_it_inserted(self):
+        owner = User.objects.create_user('owner')
+        first, second = make_donor('first'), make_donor('second')
+        req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+        for user in (first, second):
+            notifications.unread_count(user.pk)
+        insert_select = fanout.insert_select
+
+        def racing_insert(*args, **kwargs):
+            # A concurrent fan-out of the same request commits `second`'s row first
+            Notification.objects.bulk_create([Notification(user=second, request=req, message='Blood needed')])
+            return insert_select(*args, **kwargs)
+
+        with mock.patch.object(fanout, 'insert_select', racing_insert):
+            count = fanout.notify_matching_donors(req, profiles=UserProfile.objects.filter(user=first))
+        self.assertEqual(count, 1)
+        self.assertEqual(
+            dict(NotificationCounter.objects.values_list('user_id', 'unread')), {first.pk: 1, second.pk: 0},
+        )
+
+
+    def test_fanout_without_returning_goes_through_bulk_notify(self):
+        owner = User.objects.create_user('owner')
+        first, second = make_donor('first'), make_donor('second')
+        req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+        for user in (first, second):
+            notifications.unread_count(user.pk)
+        Notification.objects.bulk_create([Notification(user=second, request=req, message='Blood needed')])
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(fanout, 'insert_select') as insert_select:
+            self.assertEqual(fanout.notify_matching_donors(req), 1)
+            self.assertEqual(fanout.notify_matching_donors(req), 0)
+        insert_select.assert_not_called()
+        self.assertEqual(
+            dict(NotificationCounter.objects.values_list('user_id', 'unread')), {first.pk: 1, second.pk: 0},
+        )
+
+    def test_second_fanout_inserts_nothing(self):
+        owner = User.objects.create_user('owner')
+        donors = [make_donor('first'), make_donor('second', blood_group='A+')]
+        req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+        for user in donors:
+            notifications.unread_count(user.pk)
+        self.assertEqual(fanout.notify_matching_donors(req), 1)
+        counters = dict(NotificationCounter.objects.values_list('user_id', 'unread'))
+        with mock.patch.object(fanout, 'publish_after_commit') as publish:
+            self.assertEqual(fanout.notify_matching_donors(req), 0)
+        publish.assert_not_called()
+        self.assertEqual(Notification.objects.filter(request=req).count(), 1)
+        self.assertEqual(dict(NotificationCounter.objects.values_list('user_id', 'unread')), counters)
+        self.assertEqual(counters, {donors[0].pk: 1, donors[1].pk: 0})
+
+    def test_mark_read_moves_the_counter_by_rows_changed(self):
+        donor, other = make_donor('donor'), make_donor('other')
+        owner = User.objects.create_user('owner')
+        req = Request.objects.create(user=owner, blood_group='O-', contact_info='c')
+        ids = [
+            Notification.objects.create(user=donor, request=req, kind=kind, message='m').pk
+            for kind, _ in Notification.KIND_CHOICES[:4]
+        ]
+        theirs = Notification.objects.create(user=other, request=req, message='m')
+        self.assertEqual(notifications.unread_count(donor.pk), 4)
+        # Already-read, unknown and other users' ids do not move the counter
+        self.assertEqual(notifications.mark_read(donor.pk, ids=[ids[0], theirs.pk, 0]), 1)
+        self.assertEqual(notifications.mark_read(donor.pk, ids=[ids[0]]), 0)
+        self.assertEqual(notifications.unread_count(donor.pk), 3)
+        self.assertEqual(notifications.mark_read(donor.pk, up_to_id=ids[2]), 2)
+        self.assertEqual(notifications.unread_count(donor.pk), 1)
+        self.assertEqual(notifications.mark_read(donor.pk), 1)
+        self.assertEqual(NotificationCounter.objects.get(user=donor).unread, 0)
+        self.assertFalse(Notification.objects.get(pk=theirs.pk).read)
+
+
+class PruneArchiveTests(TestCase):
+    def test_archive_keeps_kind_and_payload(self):
+        donor = make_donor('donor')
+        owner = User.objects.create_user('owner')
+        req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+        notification = Notification.objects.create(
+            user=donor, request=req, kind=Notification.KIND_COLLECTED, message='m', payload={'request': {'id': req.pk}},
+        )
+        self.assertEqual(notifications.prune_chunk([notification.pk], archive=True), 1)
+        archived = NotificationArchive.objects.get(pk=notification.pk)
+        self.assertEqual((archived.kind, archived.payload), (Notification.KIND_COLLECTED, {'request': {'id': req.pk}}))
+
+    def test_command_archives_in_chunks_and_keeps_counters(self):
+        donor = make_donor('donor')
+        owner = User.objects.create_user('owner')
+        collected = Request.objects.create(user=owner, blood_group='O-', contact_info='c', status='collected')
+        open_req = Request.objects.create(user=owner, blood_group='O-', contact_info='c')
+        pruned = [
+            Notification.objects.create(user=donor, request=collected, kind=kind, message='m').pk
+            for kind, _ in Notification.KIND_CHOICES
+        ]
+        stale = Notification.objects.create(user=donor, request=open_req, message='stale')
+        Notification.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(days=365))
+        kept = Notification.objects.create(user=donor, request=open_req, kind=Notification.KIND_OTHER, message='m')
+        self.assertEqual(notifications.unread_count(donor.pk), 2)
+        out = StringIO()
+        with mock.patch('core.management.commands.prune_notifications.time.sleep') as sleep:
+            call_command('prune_notifications', chunk_size=2, archive=True, stdout=out)
+        self.assertIn('5 notifications archived in 3 chunks', out.getvalue())
+        self.assertEqual(sleep.call_count, 3)
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(sorted(NotificationArchive.objects.values_list('pk', flat=True)), pruned + [stale.pk])
+        # Only the stale unread row was still in the badge
+        self.assertEqual(notifications.unread_count(donor.pk), 1)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.donor = make_donor('donor')
+
+    def test_ticket_opens_the_stream_briefly(self):
+        request = APIRequestFactory().post('/api/notifications/stream/ticket/')
+        force_authenticate(request, self.donor)
+        ticket = NotificationStreamTicketView.as_view()(request).data['ticket']
+        factory = RequestFactory()
+        self.assertEqual(authenticate_stream(factory.get('/', {'ticket': ticket})), self.donor)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            self.assertIsNone(authenticate_stream(factory.get('/', {'ticket': ticket})))
+        # Access tokens no longer travel in the URL
+        token = str(AccessToken.for_user(self.donor))
+        self.assertIsNone(authenticate_stream(factory.get('/', {'token': token})))
+        self.assertEqual(authenticate_stream(factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')), self.donor)
+
+    @override_settings(FANOUT_ASYNC=True)
+    async def test_local_broker_refuses_with_async_fanout(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 501)
+
+    def test_postgres_broker_relays_fanout_to_listening_processes(self):
+        other = make_donor('other')
+        owner = User.objects.create_user('owner')
+        req = Request.objects.create(user=owner, blood_group='O-', city='Dhaka', contact_info='c')
+        mine, _ = Notification.objects.bulk_create([
+            Notification(user=self.donor, request=req, message='m'), Notification(user=other, request=req, message='m'),
+        ])
+        broker = PostgresBroker()
+        broker.users_per_message = 1
+        sent = []
+        with mock.patch.object(broker, '_notify', sent.append):
+            broker.publish_request(req.pk, [other.pk, self.donor.pk])
+        self.assertEqual(sent, [{'request': req.pk, 'users': [self.donor.pk]}, {'request': req.pk, 'users': [other.pk]}])
+        # What the listener thread of a process serving `donor` does with each NOTIFY
+        delivered = []
+        with mock.patch.object(broker, '_local_listeners', return_value={self.donor.pk}), \
+                mock.patch.object(broker, '_deliver', lambda user_id, event: delivered.append((user_id, event['id']))), \
+                mock.patch('api.broker.close_old_connections'):
+            for message in sent:
+                broker._dispatch(json.loads(json.dumps(message)))
+        self.assertEqual(delivered, [(self.donor.pk, mine.pk)])
+
+
+class NotificationIndexTests(TestCase):
+    def test_inbox_query_uses_inbox_index(self):
+        donor = make_donor('donor')
+        owner = User.objects.create_user('owner')
+        for _ in range(20):
+            req = Request.objects.create(user=owner, blood_group='O-', contact_info='c')
+            Notification.objects.create(user=donor, request=req, message='m')
+        view = NotificationsView()
+        view.request = APIRequest(APIRequestFactory().get('/api/notifications/'))
+        view.request.user = donor
+        view.format_kwarg = None
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise be read sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('notification_inbox_idx', view.get_queryset().explain())
+
+
+class AcceptRaceTests(TransactionTestCase):
+    threads = 16
+
+    def test_concurrent_accepts_have_one_winner(self):
+        owner = User.objects.create_user('owner')
+        donors = [make_donor(f'donor{i}') for i in range(self.threads)]
+        req = Request.objects.create(user=owner, blood_group='O-', contact_info='c')
+        barrier = Barrier(self.threads)
+
+        def accept(user):
+            request = APIRequestFactory().post(f'/api/requests/{req.pk}/accept/')
+            force_authenticate(request, user)
+            barrier.wait()
+            try:
+                return AcceptRequestView.as_view()(request, pk=req.pk).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            codes = sorted(pool.map(accept, donors))
+
+        self.assertEqual(codes, [200] + [409] * (self.threads - 1))
+        req.refresh_from_db()
+        self.assertEqual(req.status, 'accepted')
+        accepted = Notification.objects.filter(request=req, kind=Notification.KIND_ACCEPTED)
+        self.assertEqual(accepted.count(), 1)
+        self.assertEqual(accepted.get().user_id, owner.pk)
+        self.assertIn(req.accepted_by.email, accepted.get().message)
+
+
+class MarkCollectedTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.acceptor = make_donor('acceptor', last_donation=date(2020, 1, 1))
+        self.req = Request.objects.create(
+            user=self.owner, blood_group='O-', hospital='DMC', contact_info='c',
+            status='accepted', accepted_by=self.acceptor,
+        )
+        self.notified = make_donor('notified')
+        Notification.objects.create(user=self.notified, request=self.req, message='m')
+        self.assertEqual(notifications.unread_count(self.notified.pk), 1)
+
+    def collect(self):
+        request = APIRequestFactory().post(f'/api/requests/{self.req.pk}/collected/')
+        force_authenticate(request, self.owner)
+        return MarkCollectedView.as_view()(request, pk=self.req.pk)
+
+    def test_statements_inside_the_transaction(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.collect()
+        self.assertEqual(response.status_code, 200)
+        # TestCase turns the view's atomic block into a savepoint; count what runs inside it
+        statements = [q['sql'] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 7, '\n'.join(statements))
+        self.req.refresh_from_db()
+        self.assertEqual(self.req.status, 'collected')
+        self.assertEqual(Donation.objects.filter(user=self.acceptor).count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.acceptor).last_donation, date.today())
+        self.assertFalse(Notification.objects.filter(kind=Notification.KIND_COLLECTED).exists())
+
+    def test_failed_donation_rolls_back_the_collection(self):
+        with mock.patch('api.donors.Donation.objects.create', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.collect()
+        self.req.refresh_from_db()
+        self.assertEqual(self.req.status, 'accepted')
+        self.assertFalse(Notification.objects.filter(payload__request__status='collected').exists())
+        self.assertFalse(Notification.objects.filter(kind=Notification.KIND_COLLECTED).exists())
+        self.assertEqual(UserProfile.objects.get(user=self.acceptor).last_donation, date(2020, 1, 1))
+        self.assertEqual(notifications.unread_count(self.notified.pk), 1)
@@ -2,8 +2,11 @@ from django.urls import path
 from api.accounts import (
     RegisterView, MyProfileView, AdminUserListView, AdminUserDetailView,
 )
+from api.stream import NotificationStreamTicketView, NotificationStreamView
 from api.donors import (
     LoginView, PublicDonorSearch, BloodInventoryList, AnalyticsView, DashboardSummaryView,
+    DonorIndexStatsView, DistrictSuggestView, DonorFacetsView, NotificationsView,
+    UnreadCountView, MarkNotificationsReadView, MarkAllNotificationsReadView,
 )
 
 urlpatterns = [
@@ -21,6 +24,17 @@ urlpatterns = [
     # Public donor search and inventory
     path('donors/search/', PublicDonorSearch.as_view(), name='public-donor-search'),
     path('inventory/', BloodInventoryList.as_view(), name='inventory-list'),
+    path('donors/facets/', DonorFacetsView.as_view(), name='donor-facets'),
+    path('donors/index-stats/', DonorIndexStatsView.as_view(), name='donor-index-stats'),
+    path('districts/suggest/', DistrictSuggestView.as_view(), name='district-suggest'),
+
+    # Notifications for the signed-in user
+    path('notifications/', NotificationsView.as_view(), name='notifications'),
+    path('notifications/unread-count/', UnreadCountView.as_view(), name='notification-unread-count'),
+    path('notifications/mark-read/', MarkNotificationsReadView.as_view(), name='notification-mark-read'),
+    path('notifications/mark-all-read/', MarkAllNotificationsReadView.as_view(), name='notification-mark-all-read'),
+    path('notifications/stream/', NotificationStreamView.as_view(), name='notification-stream'),
+    path('notifications/stream/ticket/', NotificationStreamTicketView.as_view(), name='notification-stream-ticket'),
 
     # Dashboard / analytics
     path('dashboard-summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
@@ -109,6 +109,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file (not the in-memory default) so concurrency tests can open one connection per thread
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -116,7 +118,9 @@ DATABASES = {
 DATABASE_URL = os.environ.get('DATABASE_URL', '')
 if isinstance(DATABASE_URL, str) and DATABASE_URL.strip():
     try:
-        DATABASES['default'] = dj_database_url.parse(DATABASE_URL.strip(), conn_max_age=600)
+        # No persistent connections: under ASGI (the Procfile `web` process) sync code runs
+        # on varying threads, so connections kept open per thread are never reused and pile up
+        DATABASES['default'] = dj_database_url.parse(DATABASE_URL.strip(), conn_max_age=0)
     except ValueError:
         # If parsing fails (for example an empty string slipped through), keep sqlite default.
         # This prevents manage.py from crashing when DATABASE_URL is unset or invalid in local dev.
@@ -177,4 +181,69 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# Cache backend used for donor search results (see api/cache.py).
+# DJANGO_CACHE_BACKEND selects one of:
+#   locmem (default) - per-process memory; donor writes only invalidate the writing
+#                      worker's pages, so with several workers use file or redis
+#   file             - shared by workers on one host; DJANGO_CACHE_LOCATION is a directory
+#   redis            - shared by all hosts; DJANGO_CACHE_LOCATION is a redis:// URL
+#                      (any Redis-compatible server; needs the `redis` package)
+_cache_backend = os.environ.get('DJANGO_CACHE_BACKEND', 'locmem').strip().lower()
+_cache_location = os.environ.get('DJANGO_CACHE_LOCATION', '').strip()
+if _cache_backend == 'file':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': _cache_location or str(BASE_DIR / '.cache'),
+    }}
+elif _cache_backend == 'redis':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': _cache_location or os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blood-donation',
+    }}
+
+# Seconds a cached donor search page may be served; donor writes invalidate earlier.
+DONOR_SEARCH_CACHE_TIMEOUT = int(os.environ.get('DONOR_SEARCH_CACHE_TIMEOUT', '300'))
+# Cap on the above with the per-process locmem cache, where writes made by other
+# workers do not invalidate this worker's pages.
+DONOR_SEARCH_LOCAL_CACHE_TIMEOUT = int(os.environ.get('DONOR_SEARCH_LOCAL_CACHE_TIMEOUT', '10'))
+
+# In-process donor availability index (see api/donor_index.py). Each worker keeps
+# its own copy; DONOR_INDEX_MAX_AGE bounds how long it may miss writes made by
+# other workers. Every build (the first one included) runs in a background thread
+# while requests keep reading the previous snapshot, or the database before the first.
+DONOR_INDEX_ENABLED = os.environ.get('DONOR_INDEX_ENABLED', 'True') == 'True'
+DONOR_INDEX_MAX_AGE = int(os.environ.get('DONOR_INDEX_MAX_AGE', '300'))
+
+# Request fan-out (see api/fanout.py). When true, creating a request only enqueues
+# a FanoutJob and `python manage.py run_fanout_worker` (Procfile `worker`) must be
+# running to write the notifications; when false they are written in the POST.
+FANOUT_ASYNC = os.environ.get('FANOUT_ASYNC', 'False') == 'True'
+# Wave fan-out: notify at most FANOUT_WAVE_SIZE donors per wave, starting in the request's
+# district and widening every FANOUT_WAVE_INTERVAL seconds while the request is open.
+# Waves after the first are sent by run_fanout_worker.
+FANOUT_WAVES = os.environ.get('FANOUT_WAVES', 'False') == 'True'
+FANOUT_WAVE_SIZE = int(os.environ.get('FANOUT_WAVE_SIZE', '50'))
+FANOUT_WAVE_INTERVAL = int(os.environ.get('FANOUT_WAVE_INTERVAL', '900'))
+
+# Pub/sub behind notifications/stream/ (see api/broker.py). LocalBroker only reaches clients
+# connected to the process that created the notification, so the stream answers 501 with it
+# while FANOUT_ASYNC or FANOUT_WAVES is on; PostgresBroker (LISTEN/NOTIFY) reaches every process.
+_default_broker = (
+    'api.broker.PostgresBroker' if 'postgresql' in DATABASES['default']['ENGINE'] else 'api.broker.LocalBroker'
+)
+NOTIFICATION_BROKER = os.environ.get('NOTIFICATION_BROKER', _default_broker)
+# Seconds a ticket from notifications/stream/ticket/ may be used to open the stream
+NOTIFICATION_STREAM_TICKET_MAX_AGE = int(os.environ.get('NOTIFICATION_STREAM_TICKET_MAX_AGE', '60'))
+
+# Retention applied by `python manage.py prune_notifications` (the Procfile `prune`
+# process runs it with --continuous; or schedule it with cron): notifications of collected requests go on the next sweep, read
+# ones after NOTIFICATION_RETENTION_READ_DAYS, everything after NOTIFICATION_RETENTION_DAYS.
+NOTIFICATION_RETENTION_READ_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_READ_DAYS', '30'))
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '180'))
@@ -5,3 +5,7 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Core (consolidated)'
+
+    def ready(self):
+        # Register signal receivers (donor index invalidation etc.)
+        from core import signals  # noqa: F401
@@ -0,0 +1,40 @@
+"""Loader for the bundled district gazetteer (`core/data/bd_districts.json`).
+
+Each record has a `name`, `latitude`, `longitude` and optional `aliases`
+(older or alternative spellings). Used by the data migration and by
+`manage.py load_districts` after the data file changes.
+"""
+import json
+import os
+
+from core.models import normalize_district
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'bd_districts.json')
+
+
+def read_gazetteer(path=DATA_FILE):
+    """Yield (key, name, latitude, longitude) for every name and alias in the file."""
+    with open(path, encoding='utf-8') as fh:
+        records = json.load(fh)
+    for record in records:
+        for spelling in [record['name']] + record.get('aliases', []):
+            yield normalize_district(spelling), record['name'], record['latitude'], record['longitude']
+
+
+def load_gazetteer(district_model, path=DATA_FILE):
+    """Insert or update every gazetteer row; returns (created, updated).
+
+    Takes the model class so migrations can pass their historical model.
+    """
+    existing = {d.key: d for d in district_model.objects.all()}
+    created, changed = [], []
+    for key, name, latitude, longitude in read_gazetteer(path):
+        row = existing.get(key)
+        if row is None:
+            created.append(district_model(key=key, name=name, latitude=latitude, longitude=longitude))
+        elif (row.name, row.latitude, row.longitude) != (name, latitude, longitude):
+            row.name, row.latitude, row.longitude = name, latitude, longitude
+            changed.append(row)
+    district_model.objects.bulk_create(created)
+    district_model.objects.bulk_update(changed, ['name', 'latitude', 'longitude'])
+    return len(created), len(changed)
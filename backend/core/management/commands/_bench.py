@@ -0,0 +1,84 @@
+"""Shared helpers for the `bench_*` management commands.
+
+Benchmarks run against a throwaway test database (the same one Django's test
+runner would create) so they never touch real data. Modules starting with an
+underscore are not picked up as commands by Django.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from core.models import UserProfile, normalize_district
+from api.conditional import bump_donor_version
+
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
+# Rough population weights so common groups produce realistically large result sets
+BLOOD_GROUP_WEIGHTS = [30, 2, 25, 2, 33, 2, 5, 1]
+DISTRICTS = [
+    'Bagerhat', 'Bandarban', 'Barguna', 'Barishal', 'Bhola', 'Bogura', 'Brahmanbaria', 'Chandpur',
+    'Chapainawabganj', 'Chattogram', 'Chuadanga', "Cox's Bazar", 'Cumilla', 'Dhaka', 'Dinajpur', 'Faridpur',
+    'Feni', 'Gaibandha', 'Gazipur', 'Gopalganj', 'Habiganj', 'Jamalpur', 'Jashore', 'Jhalokati',
+    'Jhenaidah', 'Joypurhat', 'Khagrachari', 'Khulna', 'Kishoreganj', 'Kurigram', 'Kushtia', 'Lakshmipur',
+    'Lalmonirhat', 'Madaripur', 'Magura', 'Manikganj', 'Meherpur', 'Moulvibazar', 'Munshiganj', 'Mymensingh',
+    'Naogaon', 'Narail', 'Narayanganj', 'Narsingdi', 'Natore', 'Netrokona', 'Nilphamari', 'Noakhali',
+    'Pabna', 'Panchagarh', 'Patuakhali', 'Pirojpur', 'Rajbari', 'Rajshahi', 'Rangamati', 'Rangpur',
+    'Satkhira', 'Shariatpur', 'Sherpur', 'Sirajganj', 'Sunamganj', 'Sylhet', 'Tangail', 'Thakurgaon',
+]
+
+
+@contextmanager
+def temporary_database():
+    """Create a throwaway test database for the duration of the block."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_profiles(count, seed=1, batch_size=5000, start=0):
+    """Bulk insert `count` users with donor profiles; returns elapsed seconds."""
+    rng = random.Random(seed)
+    today = date.today()
+    started = time.perf_counter()
+    for offset in range(start, start + count, batch_size):
+        size = min(batch_size, start + count - offset)
+        users = User.objects.bulk_create([
+            User(username=f'bench{offset + i}', first_name='Bench', last_name=str(offset + i),
+                 email=f'bench{offset + i}@example.com', password='!')
+            for i in range(size)
+        ])
+        profiles = []
+        for user in users:
+            district = rng.choice(DISTRICTS)
+            last = None if rng.random() < 0.3 else today - timedelta(days=rng.randint(0, 720))
+            profiles.append(UserProfile(
+                user_id=user.id,
+                blood_group=rng.choices(BLOOD_GROUPS, BLOOD_GROUP_WEIGHTS)[0],
+                district=district,
+                district_key=normalize_district(district),
+                last_donation=last,
+                phone='0170000000',
+                share_phone=rng.random() < 0.5,
+            ))
+        UserProfile.objects.bulk_create(profiles)
+    # bulk_create sends no signals: move the donor version ourselves
+    bump_donor_version()
+    return time.perf_counter() - started
+
+
+def time_call(fn, repeat=5):
+    """Run `fn` `repeat` times and return (median_seconds, last_result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
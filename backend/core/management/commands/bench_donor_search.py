@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.test import RequestFactory
+
+from api.donors import PublicDonorSearch, donor_cutoff
+from core.models import UserProfile
+
+from ._bench import temporary_database, seed_profiles, time_call
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark public donor search latency at several table sizes. '
+        'Runs against a throwaway test database; safe to run anywhere.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000],
+                            help='Profile counts to benchmark (default: 100000 1000000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (median is reported)')
+        parser.add_argument('--blood-group', default='AB-')
+        parser.add_argument('--district', default='Sylhet')
+
+    def handle(self, *args, **options):
+        bg, district = options['blood_group'], options['district']
+        factory = RequestFactory()
+
+        def legacy_queryset():
+            # Pre-normalization query: case-insensitive matches defeat every index
+            return UserProfile.objects.select_related('user').filter(
+                blood_group__iexact=bg, district__iexact=district,
+            ).filter(models.Q(last_donation__isnull=True) | models.Q(last_donation__lt=donor_cutoff()))
+
+        def current_queryset():
+            view = PublicDonorSearch()
+            view.request = view.initialize_request(
+                factory.get('/api/donors/search/', {'blood_group': bg, 'district': district}))
+            return view.get_queryset()
+
+        with temporary_database():
+            seeded = 0
+            for size in sorted(options['sizes']):
+                elapsed = seed_profiles(size - seeded, start=seeded)
+                seeded = size
+                self.stdout.write(f'\n== {size:,} profiles (seeded +{elapsed:.1f}s) ==')
+                for label, build in (('legacy iexact', legacy_queryset), ('indexed', current_queryset)):
+                    plan = build().explain().splitlines()
+                    median, rows = time_call(lambda: list(build()), repeat=options['repeat'])
+                    self.stdout.write(f'{label:>14}: {median * 1000:8.2f} ms  rows={len(rows):,}')
+                    self.stdout.write(f'{"":>14}  plan: {" | ".join(line.strip() for line in plan)}')
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.fanout import matching_donors, notify_matching_donors, bulk_notify
+from core.models import Notification, Request
+
+from ._bench import temporary_database, seed_profiles, time_call
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark notifications inserted per second by request fan-out: the per-row '
+        'create() loop, chunked bulk_create over ids, and one INSERT ... SELECT. '
+        'Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=75_000,
+                            help='Donor profiles to seed (an AB+ request matches every available one)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per method (median is reported)')
+        parser.add_argument('--blood-group', default='AB+', help='Requested group (AB+ matches the most donors)')
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            seed_profiles(options['profiles'])
+            requester = User.objects.create(username='bench-requester', password='!')
+            req = Request.objects.create(user=requester, blood_group=options['blood_group'], city='Dhaka')
+
+            def per_row():
+                # The pre-fan-out perform_create loop
+                rows = 0
+                for user_id in matching_donors(req).values_list('user_id', flat=True):
+                    Notification.objects.create(user_id=user_id, request=req, message='Blood needed')
+                    rows += 1
+                return rows
+
+            def bulk():
+                return bulk_notify(req, matching_donors(req).values_list('user_id', flat=True))
+
+            methods = (
+                ('create() per row', per_row),
+                ('chunked bulk_create', bulk),
+                ('INSERT ... SELECT', lambda: notify_matching_donors(req)),
+            )
+            self.stdout.write(f"{options['profiles']} profiles, request for {options['blood_group']}")
+            for label, fn in methods:
+                seconds, rows = time_call(lambda: self.run_rolled_back(fn), repeat=options['repeat'])
+                rate = rows / seconds if seconds else float('inf')
+                self.stdout.write(f'  {label:<22} {rows:>8} rows  {seconds * 1000:9.1f} ms  {rate:12,.0f} rows/s')
+
+    def run_rolled_back(self, fn):
+        """Run one fan-out in a transaction that is rolled back, and return the rows it wrote."""
+        try:
+            with transaction.atomic():
+                rows = fn()
+                raise _Rollback
+        except _Rollback:
+            return rows
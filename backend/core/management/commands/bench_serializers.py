@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.donors import available_profiles
+from api.projections import PUBLIC_DONOR_PROJECTION, INVENTORY_PROJECTION
+from api.serializers_donors import PublicDonorProfileSerializer
+
+from ._bench import temporary_database, seed_profiles, time_call
+
+
+def legacy_inventory_rows(queryset):
+    # The pre-projection BloodInventoryList loop, kept here as the reference
+    donors = []
+    for prof in queryset.select_related('user'):
+        user = prof.user
+        full_name = f"{user.first_name} {user.last_name}".strip() or user.username
+        donors.append({
+            'id': prof.id,
+            'username': user.username,
+            'full_name': full_name,
+            'email': user.email,
+            'phone': prof.phone if getattr(prof, 'share_phone', False) else None,
+            'blood_group': prof.blood_group,
+            'district': prof.district,
+            'last_donation': prof.last_donation,
+        })
+    return donors
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmark rows/second of the ModelSerializer read path against the '
+        'values_list() projection path, and check both render byte-identical JSON. '
+        'Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=50_000)
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per path (median is reported)')
+
+    def handle(self, *args, **options):
+        render = JSONRenderer().render
+        with temporary_database():
+            seed_profiles(options['profiles'])
+            queryset = available_profiles().order_by('id')
+
+            def serializer_path():
+                return PublicDonorProfileSerializer(queryset.select_related('user'), many=True).data
+
+            def projection_path(projection):
+                paths, formatter = projection.compile()
+                return [formatter(row) for row in queryset.values_list(*paths)]
+
+            cases = (
+                ('donor search', serializer_path, lambda: projection_path(PUBLIC_DONOR_PROJECTION)),
+                ('inventory', lambda: legacy_inventory_rows(queryset), lambda: projection_path(INVENTORY_PROJECTION)),
+            )
+            for label, old, new in cases:
+                old_time, old_rows = time_call(old, repeat=options['repeat'])
+                new_time, new_rows = time_call(new, repeat=options['repeat'])
+                if render(old_rows) != render(new_rows):
+                    raise CommandError(f'{label}: projection output differs from the reference path')
+                count = len(new_rows)
+                self.stdout.write(
+                    f'{label:>13}: model path {count / old_time:10,.0f} rows/s | '
+                    f'projection {count / new_time:10,.0f} rows/s | x{old_time / new_time:.1f} '
+                    f'({count:,} rows, JSON identical)'
+                )
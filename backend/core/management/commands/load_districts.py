@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.gazetteer import DATA_FILE, load_gazetteer
+from core.models import District
+
+
+class Command(BaseCommand):
+    help = 'Load or refresh the district gazetteer (names, aliases, coordinates). Safe to run multiple times.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=DATA_FILE, help='Gazetteer JSON file (defaults to the bundled one)')
+
+    def handle(self, *args, **options):
+        created, updated = load_gazetteer(District, options['file'])
+        self.stdout.write(self.style.SUCCESS(f'Districts: {created} created, {updated} updated'))
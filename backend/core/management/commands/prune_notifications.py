@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications import prunable_notifications, prune_chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete (or archive with --archive) notifications past retention in small id-ordered '
+        'chunks with a pause between them, so no statement holds locks on the whole table. '
+        'Covers notifications of collected requests, read ones older than '
+        'NOTIFICATION_RETENTION_READ_DAYS and any older than NOTIFICATION_RETENTION_DAYS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per delete transaction')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between chunks')
+        parser.add_argument('--archive', action='store_true', help='Copy rows to NotificationArchive before deleting')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be pruned')
+        parser.add_argument('--continuous', action='store_true', help='Keep sweeping until interrupted')
+        parser.add_argument('--interval', type=float, default=300, help='Seconds between sweeps with --continuous')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{prunable_notifications().count()} notifications would be pruned')
+            return
+        try:
+            while True:
+                self.sweep(options)
+                if not options['continuous']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped; committed chunks stay pruned')
+
+    def sweep(self, options):
+        verb = 'archived' if options['archive'] else 'deleted'
+        started = time.monotonic()
+        busy = 0.0
+        total = chunks = 0
+        last_id = 0
+        while True:
+            chunk_started = time.monotonic()
+            # Re-evaluate retention per chunk and walk forward by id, so each chunk is a bounded index range
+            ids = list(
+                prunable_notifications().filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            total += prune_chunk(ids, archive=options['archive'])
+            busy += time.monotonic() - chunk_started
+            chunks += 1
+            last_id = ids[-1]
+            if chunks % 10 == 0:
+                self.stdout.write(f'  {total} {verb} so far ({total / busy:,.0f} rows/s while working)')
+            time.sleep(options['pause'])
+        elapsed = time.monotonic() - started
+        rate = f'{total / busy:,.0f} rows/s while working' if busy else 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} notifications {verb} in {chunks} chunks, {elapsed:.1f}s ({rate})'
+        ))
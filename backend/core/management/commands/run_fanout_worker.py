@@ -0,0 +1,48 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.fanout import JOB_BATCH_SIZE, JOB_MAX_ATTEMPTS, JOB_STALE_AFTER, claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        'Process queued request fan-out jobs (FanoutJob): claim one at a time and write its '
+        'notifications in batches, resuming interrupted jobs. Run several for more throughput.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=JOB_BATCH_SIZE, help='Donors per committed batch')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=JOB_STALE_AFTER,
+                            help='Seconds without progress before a running job is taken over')
+        parser.add_argument('--max-attempts', type=int, default=JOB_MAX_ATTEMPTS)
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(f'Fan-out worker {worker_id} started')
+        try:
+            while True:
+                close_old_connections()
+                job = claim_job(worker_id, stale_after=options['stale_after'])
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                started = time.monotonic()
+                try:
+                    written = run_job(job, batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+                except Exception as exc:
+                    self.stderr.write(f'Job {job.pk} (request {job.request_id}) attempt {job.attempts} failed: {exc!r}')
+                    continue
+                self.stdout.write(
+                    f'Job {job.pk} (request {job.request_id}) {job.status}: '
+                    f'{written} notifications in {time.monotonic() - started:.2f}s'
+                )
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; an interrupted job resumes from its last batch')
@@ -0,0 +1,76 @@
+from django.db import migrations, models
+
+from core.models import normalize_blood_group, clean_district, normalize_district
+
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def backfill_canonical_values(apps, schema_editor):
+    """Rewrite blood_group/district in canonical form and derive district_key.
+
+    Rows are walked in primary-key order in fixed-size batches so the backfill
+    never holds the whole table in memory on large deployments.
+    """
+    UserProfile = apps.get_model('core', 'UserProfile')
+    last_pk = 0
+    while True:
+        batch = list(
+            UserProfile.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('id', 'blood_group', 'district', 'district_key')[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        changed = []
+        for prof in batch:
+            blood_group = normalize_blood_group(prof.blood_group) or None
+            district = clean_district(prof.district) or None
+            district_key = normalize_district(district) or None
+            if (blood_group, district, district_key) != (prof.blood_group, prof.district, prof.district_key):
+                prof.blood_group = blood_group
+                prof.district = district
+                prof.district_key = district_key
+                changed.append(prof)
+        if changed:
+            UserProfile.objects.bulk_update(changed, ['blood_group', 'district', 'district_key'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_userprofile_donated_recently_userprofile_not_ready"),
+    ]
+
+    operations = [
+        # 0002 added the legacy flag columns with raw SQL; record them in the
+        # migration state so later autodetected migrations don't re-add them.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name="userprofile",
+                    name="donated_recently",
+                    field=models.BooleanField(default=False),
+                ),
+                migrations.AddField(
+                    model_name="userprofile",
+                    name="not_ready",
+                    field=models.BooleanField(default=False),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="district_key",
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(backfill_canonical_values, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="userprofile",
+            index=models.Index(
+                fields=["blood_group", "district_key", "last_donation"],
+                name="donor_search_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+from core.gazetteer import load_gazetteer
+
+
+def load_districts(apps, schema_editor):
+    load_gazetteer(apps.get_model('core', 'District'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_userprofile_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="District",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=100)),
+                ("key", models.CharField(max_length=100, unique=True)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["latitude", "longitude"], name="district_latlon_idx")],
+            },
+        ),
+        migrations.RunPython(load_districts, migrations.RunPython.noop),
+    ]
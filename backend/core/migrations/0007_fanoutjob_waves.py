@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_fanoutjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fanoutjob',
+            name='run_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fanoutjob',
+            name='wave',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def classify_and_dedupe(apps, schema_editor):
+    """Derive `kind` for existing rows from their message, then drop duplicates.
+
+    Duplicates of one (user, request, kind) keep their oldest row. Unread
+    counters are dropped so they re-seed from the cleaned table on next read.
+    """
+    Notification = apps.get_model('core', 'Notification')
+    NotificationCounter = apps.get_model('core', 'NotificationCounter')
+    Notification.objects.exclude(message='Blood needed').update(kind='other')
+    Notification.objects.filter(message__startswith='Your request was accepted by').update(kind='accepted')
+    Notification.objects.filter(message='Requester marked the request as collected').update(kind='collected')
+    duplicates = (
+        Notification.objects.values('user_id', 'request_id', 'kind')
+        .annotate(keep=Min('id'), copies=Count('id'))
+        .filter(copies__gt=1)
+    )
+    removed = 0
+    for group in duplicates.iterator():
+        removed += Notification.objects.filter(
+            user_id=group['user_id'], request_id=group['request_id'], kind=group['kind'],
+        ).exclude(id=group['keep']).delete()[0]
+    if removed:
+        NotificationCounter.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_notificationarchive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("request", "New request for a matching donor"),
+                    ("accepted", "Request accepted (to the requester)"),
+                    ("collected", "Request collected (to the acceptor)"),
+                    ("other", "Other"),
+                ],
+                default="request",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(classify_and_dedupe, migrations.RunPython.noop),
+    ]
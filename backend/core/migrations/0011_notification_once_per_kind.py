@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0010 so the data cleanup commits before the table is altered
+    # (Postgres refuses ALTER TABLE with pending trigger events in one transaction).
+
+    dependencies = [
+        ("core", "0010_notification_kind"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(fields=("user", "request", "kind"), name="notification_once_per_kind"),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+def snapshot_existing(apps, schema_editor):
+    """Write the payload of existing notifications: one UPDATE per request that has any.
+
+    Mirrors `api.notifications.request_payload` at the time of writing.
+    """
+    Notification = apps.get_model('core', 'Notification')
+    Request = apps.get_model('core', 'Request')
+    UserProfile = apps.get_model('core', 'UserProfile')
+    requests = Request.objects.filter(
+        id__in=Notification.objects.values('request_id'),
+    ).select_related('accepted_by')
+    for req in requests.iterator():
+        accepted_by = None
+        if req.accepted_by_id:
+            user = req.accepted_by
+            profile = UserProfile.objects.filter(user_id=user.pk).values('phone', 'share_phone').first()
+            accepted_by = {
+                'name': f"{user.first_name} {user.last_name}".strip() or user.username,
+                'email': user.email,
+                'phone': profile['phone'] if profile and profile['share_phone'] else None,
+            }
+        Notification.objects.filter(request_id=req.pk).update(payload={
+            'request': {
+                'id': req.pk,
+                'user': req.user_id,
+                'blood_group': req.blood_group,
+                'hospital': req.hospital,
+                'city': req.city,
+                'address': req.address,
+                'contact_info': req.contact_info,
+                'status': req.status,
+            },
+            'accepted_by': accepted_by,
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_notification_once_per_kind"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="payload",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(snapshot_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex built with CREATE INDEX CONCURRENTLY on Postgres, so the table stays writable.
+
+    Other backends get a plain CREATE INDEX. (`django.contrib.postgres`'s
+    operation of the same name needs psycopg installed even on SQLite.)
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY cannot run inside a transaction block
+    atomic = False
+
+    dependencies = [
+        ("core", "0012_notification_payload"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(fields=["user", "-created_at"], name="notification_inbox_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("read", False)), fields=["user", "id"], name="notification_unread_idx",
+            ),
+        ),
+    ]
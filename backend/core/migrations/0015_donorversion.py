@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+def create_row(apps, schema_editor):
+    apps.get_model('core', 'DonorVersion').objects.create(pk=1, version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_userprofile_updated_at_db_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:23
+
+import core.models
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_donorversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userprofile',
+            name='donor_search_idx',
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=core.models.NullsFirstIndex(fields=['blood_group', 'district_key', 'last_donation', 'id'], name='donor_search_idx', nulls_first=('last_donation',)),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=core.models.NullsFirstIndex(fields=['blood_group', 'last_donation', 'id'], name='donor_group_idx', nulls_first=('last_donation',)),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=core.models.NullsFirstIndex(fields=['district_key', 'last_donation', 'id'], name='donor_district_idx', nulls_first=('last_donation',)),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=core.models.NullsFirstIndex(fields=['last_donation', 'id'], name='donor_order_idx', nulls_first=('last_donation',)),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_donor_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='kind',
+            field=models.CharField(choices=[('request', 'New request for a matching donor'), ('accepted', 'Request accepted (to the requester)'), ('collected', 'Request collected (to the acceptor)'), ('other', 'Other')], default='request', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -9,35 +9,137 @@ After the migration is applied and verified, the original `donors` app can be
 safely removed and `core` can become the canonical app for these models.
 """
 
+import re
+
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Now
 from django.contrib.auth.models import User
 
 
+def normalize_blood_group(value):
+    """Return the canonical spelling of a blood group ('o +' -> 'O+')."""
+    if value is None:
+        return None
+    return re.sub(r"\s+", "", str(value)).upper()
+
+
+def clean_district(value):
+    """Return a district trimmed with inner whitespace collapsed, keeping its case for display."""
+    if value is None:
+        return None
+    return " ".join(str(value).split())
+
+
+def normalize_district(value):
+    """Return the canonical search key for a district ('  cox bazar ' -> 'COX BAZAR')."""
+    cleaned = clean_district(value)
+    return cleaned.upper() if cleaned is not None else None
+
+
+class NullsFirstIndex(models.Index):
+    """Index whose `nulls_first` columns sort NULLs first, the order keyset searches read.
+
+    SQLite and MySQL already put NULLs first in ascending order (and SQLite
+    rejects the clause in CREATE INDEX), so only Postgres gets NULLS FIRST.
+    """
+
+    def __init__(self, *args, nulls_first=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nulls_first = tuple(nulls_first)
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if self.nulls_first and schema_editor.connection.vendor == 'postgresql':
+            index = models.Index(
+                *[F(field).asc(nulls_first=True) if field in self.nulls_first else F(field) for field in self.fields],
+                name=self.name, condition=self.condition,
+            )
+            return index.create_sql(model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def deconstruct(self):
+        path, args, kwargs = super().deconstruct()
+        if self.nulls_first:
+            kwargs['nulls_first'] = self.nulls_first
+        return path, args, kwargs
+
+
 class UserProfile(models.Model):
     """Profile data attached to Django's User model.
 
     Fields:
     - phone, blood_group, last_donation, district: basic contact and donation info
     - share_phone: flag indicating whether the donor consents to share phone
+    - district_key: canonical (trimmed, upper-cased) district used by searches;
+      derived from `district` on every save so lookups can use an index.
+      `blood_group` and `district` are stored canonically too (see `normalize`),
+      whether the row comes from an API serializer, the admin, a fixture or the ORM
+    - updated_at: last write to the profile (or its user's name/email)
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=15, blank=True, null=True)
     blood_group = models.CharField(max_length=10, blank=True, null=True)
     last_donation = models.DateField(blank=True, null=True)
     district = models.CharField(max_length=100, blank=True, null=True)
+    district_key = models.CharField(max_length=100, blank=True, null=True, editable=False)
     share_phone = models.BooleanField(default=False)
     # Legacy flags kept here so the model matches the existing `donors_userprofile` table
     # which may have non-null constraints from older migrations. Keeping them allows
     # creating rows without IntegrityError when the DB schema still requires these columns.
     donated_recently = models.BooleanField(default=False)
     not_ready = models.BooleanField(default=False)
+    # db_default covers raw inserts (fixtures), which skip auto_now
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
 
     def __str__(self):
         return f"{self.user.username}'s profile"
-    
+
+    def normalize(self):
+        """Canonicalize `blood_group`/`district` and derive `district_key`.
+
+        Run by the `core.signals.profile_saving` pre_save receiver, which also
+        sees raw fixture saves (`loaddata` bypasses `save()`).
+        """
+        self.blood_group = normalize_blood_group(self.blood_group) or None
+        self.district = clean_district(self.district) or None
+        self.district_key = normalize_district(self.district) or None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            extra = {'updated_at'} | ({'district_key'} if 'district' in update_fields else set())
+            kwargs['update_fields'] = set(update_fields) | extra
+        super().save(*args, **kwargs)
+
     class Meta:
         # Map to the original donors app table to avoid immediate DB migrations
         db_table = 'donors_userprofile'
+        # One per PublicDonorSearch filter shape, each ending in the keyset order
+        # (last_donation NULLS FIRST, id) so every page (and every rank partition
+        # of the compatible/nearby modes) is a bounded index range
+        indexes = [
+            NullsFirstIndex(fields=['blood_group', 'district_key', 'last_donation', 'id'],
+                            nulls_first=['last_donation'], name='donor_search_idx'),
+            NullsFirstIndex(fields=['blood_group', 'last_donation', 'id'],
+                            nulls_first=['last_donation'], name='donor_group_idx'),
+            NullsFirstIndex(fields=['district_key', 'last_donation', 'id'],
+                            nulls_first=['last_donation'], name='donor_district_idx'),
+            NullsFirstIndex(fields=['last_donation', 'id'], nulls_first=['last_donation'], name='donor_order_idx'),
+        ]
+
+
+class DonorVersion(models.Model):
+    """Counter moved by every write that can change a donor listing.
+
+    One row (pk=1), bumped inside the transaction of the write (see
+    `api.conditional.bump_donor_version`). Unlike the cache-held donor
+    generation it is the same for every worker, so donor list ETags and the
+    in-process donor index are checked against it with a primary-key read.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Donor data version {self.version}"
 
 
 class Request(models.Model):
@@ -74,17 +176,127 @@ class Request(models.Model):
 
 
 class Notification(models.Model):
+    """A message to one user about one request.
+
+    `kind` says why it was sent; a user gets at most one notification of each
+    kind per request (enforced by the `notification_once_per_kind` constraint),
+    which makes retried or resumed fan-outs no-ops.
+    """
+    KIND_REQUEST = 'request'
+    KIND_ACCEPTED = 'accepted'
+    KIND_COLLECTED = 'collected'
+    KIND_OTHER = 'other'
+    KIND_CHOICES = [
+        (KIND_REQUEST, 'New request for a matching donor'),
+        (KIND_ACCEPTED, 'Request accepted (to the requester)'),
+        (KIND_COLLECTED, 'Request collected (to the acceptor)'),
+        (KIND_OTHER, 'Other'),
+    ]
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_REQUEST)
     message = models.CharField(max_length=255)
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Snapshot of the request (and acceptor) the list renders; see api.notifications.request_payload
+    payload = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"To {self.user.username}: {self.message}"
     
     class Meta:
         db_table = 'donors_notification'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'request', 'kind'], name='notification_once_per_kind'),
+        ]
+        indexes = [
+            # Inbox: a user's notifications newest first (NotificationsView)
+            models.Index(fields=['user', '-created_at'], name='notification_inbox_idx'),
+            # Unread rows only: badge seeding and mark-read (partial where the backend supports it)
+            models.Index(fields=['user', 'id'], name='notification_unread_idx', condition=models.Q(read=False)),
+        ]
+
+
+class NotificationArchive(models.Model):
+    """Notifications moved out of the live table by `manage.py prune_notifications --archive`.
+
+    Keeps the original id; `user_id`/`request_id` are plain columns so
+    archived rows survive the deletion of their user or request, and the
+    `payload` snapshot still says what the request was about.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField(db_index=True)
+    request_id = models.BigIntegerField()
+    kind = models.CharField(max_length=20, choices=Notification.KIND_CHOICES, default=Notification.KIND_REQUEST)
+    message = models.CharField(max_length=255)
+    read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    payload = models.JSONField(default=dict, blank=True)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived notification {self.id} to user {self.user_id}"
+
+
+class NotificationCounter(models.Model):
+    """Denormalized count of a user's unread notifications (badge).
+
+    Counts what `NotificationsView` lists as unread: `read` is false and the
+    request is not collected. Maintained in the same transaction as every
+    write that changes it (see `api.notifications`); a missing row is computed
+    from the notifications table on first read.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+
+class FanoutJob(models.Model):
+    """Durable queue entry: notify the donors matching one request.
+
+    Created by `RequestList.perform_create` when `FANOUT_ASYNC` is on and
+    processed by `manage.py run_fanout_worker`. `cursor` is the last
+    `UserProfile.id` already handled; each batch commits its notifications
+    together with the new cursor, so a crashed job resumes where it stopped.
+
+    Wave jobs (`wave` set, see `FANOUT_WAVES`) notify one capped, widening
+    circle of donors each and reschedule themselves `run_after` the wave
+    interval while the request stays open.
+
+    `attempts` counts claims of the current wave (of the whole job without
+    waves); a failed claim sets `run_after` with exponential backoff.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('cancelled', 'Cancelled'),
+        ('failed', 'Failed'),
+    ]
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='fanout_jobs')
+    message = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    cursor = models.BigIntegerField(default=0)
+    notified = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    wave = models.PositiveSmallIntegerField(blank=True, null=True)
+    run_after = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Fan-out for request {self.request_id} ({self.status}, {self.notified} notified)"
+
+    class Meta:
+        indexes = [
+            # Workers scan for the oldest claimable job
+            models.Index(fields=['status', 'created_at'], name='fanout_claim_idx'),
+        ]
 
 
 class BloodInventory(models.Model):
@@ -112,3 +324,25 @@ class Donation(models.Model):
     
     class Meta:
         db_table = 'donors_donation'
+
+
+class District(models.Model):
+    """Gazetteer entry: a district (or a common alternative spelling of one) with coordinates.
+
+    Loaded from `core/data/bd_districts.json` (see `core.gazetteer`). Alternative
+    spellings get their own row with the canonical `name` and the same
+    coordinates, so donors who typed an old spelling still match by `key`.
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        indexes = [
+            # Bounding-box pruning for proximity search
+            models.Index(fields=['latitude', 'longitude'], name='district_latlon_idx'),
+        ]
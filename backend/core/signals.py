@@ -0,0 +1,101 @@
+"""Model signal receivers that keep derived state (donor index, caches) current.
+
+Connected from `CoreConfig.ready()`. Receivers defer their work with
+`transaction.on_commit` so rolled-back writes never leak into caches; the
+donor version (`api.conditional`) is bumped in the write's own transaction.
+Each bump is paired with exactly one donor index refresh, which is how the
+index knows which version it reflects (see `api.donor_index`).
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import Notification, NotificationCounter, Request, UserProfile
+
+
+@receiver(pre_save, sender=UserProfile, dispatch_uid='core.profile_saving')
+def profile_saving(sender, instance, **kwargs):
+    # Also for raw=True: fixture rows must land in canonical form or searches miss them
+    instance.normalize()
+
+
+@receiver(post_save, sender=UserProfile, dispatch_uid='core.profile_saved')
+def profile_saved(sender, instance, **kwargs):
+    from api.cache import bump_donor_generation
+    from api.conditional import bump_donor_version
+    from api.donor_index import get_donor_index
+
+    bump_donor_version()
+    transaction.on_commit(bump_donor_generation)
+    index = get_donor_index()
+    if index is not None:
+        profile_id = instance.pk
+        transaction.on_commit(lambda: index.refresh_profile(profile_id))
+
+
+@receiver(post_delete, sender=UserProfile, dispatch_uid='core.profile_deleted')
+def profile_deleted(sender, instance, **kwargs):
+    from api.cache import bump_donor_generation
+    from api.conditional import bump_donor_version
+    from api.donor_index import get_donor_index
+
+    bump_donor_version()
+    transaction.on_commit(bump_donor_generation)
+    index = get_donor_index()
+    if index is not None:
+        profile_id = instance.pk
+        transaction.on_commit(lambda: index.remove_profile(profile_id))
+
+
+@receiver(post_save, sender=User, dispatch_uid='core.user_saved')
+def user_saved(sender, instance, created, **kwargs):
+    # Names and email are denormalized into donor search results and index entries
+    if created:
+        return
+    from api.cache import bump_donor_generation
+    from api.conditional import bump_donor_version
+    from api.donor_index import get_donor_index
+
+    # update() sends no signals; a user without a profile is in no donor list
+    if not UserProfile.objects.filter(user_id=instance.pk).update(updated_at=timezone.now()):
+        return
+    bump_donor_version()
+    transaction.on_commit(bump_donor_generation)
+    index = get_donor_index()
+    if index is not None:
+        user_id = instance.pk
+        transaction.on_commit(lambda: index.refresh_user(user_id))
+
+
+@receiver(pre_save, sender=Notification, dispatch_uid='core.notification_saving')
+def notification_saving(sender, instance, **kwargs):
+    # Single creates that did not pass a snapshot get the request's current one
+    if not instance.payload and instance.request_id:
+        from api.notifications import request_payload
+
+        instance.payload = request_payload(instance.request)
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='core.notification_saved')
+def notification_saved(sender, instance, created, **kwargs):
+    # Push to open notification streams; bulk fan-out publishes itself (no signals)
+    if not created:
+        return
+    from api.broker import publish_notification
+
+    if not instance.read and instance.request.status != 'collected':
+        # Same transaction as the insert (see api.notifications)
+        NotificationCounter.objects.filter(user_id=instance.user_id).update(unread=F('unread') + 1)
+    transaction.on_commit(lambda: publish_notification(instance))
+
+
+@receiver(pre_delete, sender=Request, dispatch_uid='core.request_deleting')
+def request_deleting(sender, instance, **kwargs):
+    # Its notifications cascade away; collected ones were already uncounted
+    if instance.status != 'collected':
+        from api.notifications import request_left_unread
+
+        request_left_unread(instance.pk)
@@ -12,6 +12,7 @@ function DonorSearch() {
   const [bloodGroup, setBloodGroup] = useState('');
   const [district, setDistrict] = useState('');
   const [results, setResults] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [message, setMessage] = useState('');
   const isLoggedIn = !!localStorage.getItem('access');
 
@@ -23,8 +24,21 @@ function DonorSearch() {
       if (bloodGroup) params.append('blood_group', bloodGroup);
       if (district) params.append('district', district);
       const res = await axios.get(`/api/donors/search/?${params.toString()}`);
-      setResults(res.data);
-      if (res.data.length === 0) setMessage('No donors found.');
+      // Search is cursor-paginated: { next, previous, results }
+      setResults(res.data.results);
+      setNextUrl(res.data.next);
+      if (res.data.results.length === 0) setMessage('No donors found.');
+    } catch {
+      setMessage('Search failed.');
+    }
+  };
+
+  const handleLoadMore = async () => {
+    if (!nextUrl) return;
+    try {
+      const res = await axios.get(nextUrl);
+      setResults(prev => prev.concat(res.data.results));
+      setNextUrl(res.data.next);
     } catch {
       setMessage('Search failed.');
     }
@@ -75,6 +89,7 @@ function DonorSearch() {
           );
         })}
       </ul>
+      {nextUrl && <button type="button" className="btn btn-primary" onClick={handleLoadMore}>Load more</button>}
     </div>
   );
 }